@@ -0,0 +1,401 @@
+# (c) This file is part of the course
+# Mathematical Logic through Programming
+# by Gonczarowski and Nisan.
+# File name: propositions/bdd.py
+
+"""Reduced ordered binary decision diagrams of propositional formulae."""
+
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from propositions.syntax import *
+
+#: The truth functions of the binary operators, for `BDD.apply`.
+_BINARY_OPERATORS = {'&': lambda p, q: p and q, '|': lambda p, q: p or q,
+                     '->': lambda p, q: not p or q, '+': lambda p, q: p != q,
+                     '<->': lambda p, q: p == q,
+                     '-&': lambda p, q: not (p and q),
+                     '-|': lambda p, q: not (p or q)}
+
+
+class BDD:
+    """A manager of reduced ordered binary decision diagrams (ROBDDs) over a
+    fixed list of variables.
+
+    Each diagram is identified by an integer node, where `FALSE` and `TRUE` are
+    the two terminal nodes, and every other node tests a single variable and
+    continues to a low node if the variable does not hold and to a high node if
+    it does. Along every path the variables are tested in the order of
+    `variables`, no node has equal low and high nodes, and a unique table
+    guarantees that no two nodes test the same variable with the same low and
+    high nodes. Consequently, two diagrams of the same manager describe
+    equivalent formulae if and only if they are the same node, and the results
+    of operations on nodes are cached by the manager.
+
+    Attributes:
+        variables (`~typing.Tuple`\\[`str`, ...]): the variables of the
+            manager, in the order in which they are tested.
+    """
+    variables: Tuple[str, ...]
+
+    #: The terminal node of the diagram that never holds.
+    FALSE = 0
+    #: The terminal node of the diagram that always holds.
+    TRUE = 1
+
+    def __init__(self, variables: Sequence[str]) -> None:
+        """Initializes a `BDD` manager with no non-terminal nodes.
+
+        Parameters:
+            variables: the variables of the manager, in the order in which they
+                are to be tested. The size of the diagrams may depend heavily
+                on this order.
+        """
+        for variable in variables:
+            assert is_variable(variable)
+        self.variables = tuple(variables)
+        self._levels = {variable: level
+                        for level, variable in enumerate(self.variables)}
+        assert len(self._levels) == len(self.variables)
+        # Each node is a triplet of the level of its variable, its low node,
+        # and its high node. Terminal nodes are at the level past the last
+        # variable.
+        terminal = (len(self.variables), 0, 0)
+        self._nodes = [terminal, terminal]
+        self._unique = {}
+        self._cache = {}
+        # Weakly keyed, so that the manager does not keep built formulae alive.
+        self._built = WeakKeyDictionary()
+
+    def __len__(self) -> int:
+        """Computes the number of nodes of the manager.
+
+        Returns:
+            The number of nodes of the manager, including the terminal ones.
+        """
+        return len(self._nodes)
+
+    def node(self, variable: str, low: int, high: int) -> int:
+        """Finds the node that tests the given variable, adding it if needed.
+
+        Parameters:
+            variable: variable for the node to test, which must precede the
+                variables tested by the given low and high nodes.
+            low: node to continue to if the variable does not hold.
+            high: node to continue to if the variable holds.
+
+        Returns:
+            The node that tests the given variable and continues to the given
+            low and high nodes, or the low node if it equals the high node.
+        """
+        level = self._levels[variable]
+        assert level < self._nodes[low][0] and level < self._nodes[high][0]
+        return self._node(level, low, high)
+
+    def _node(self, level: int, low: int, high: int) -> int:
+        """Finds the node that tests the variable at the given level, adding it
+        if needed.
+
+        Parameters:
+            level: level of the variable for the node to test.
+            low: node to continue to if the variable does not hold.
+            high: node to continue to if the variable holds.
+
+        Returns:
+            The node that tests the given variable and continues to the given
+            low and high nodes, or the low node if it equals the high node.
+        """
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self._unique.get(key)
+        if node is None:
+            node = len(self._nodes)
+            self._nodes.append(key)
+            self._unique[key] = node
+        return node
+
+    def apply(self, operator: str, first: int, second: int) -> int:
+        """Applies the given binary operator to the given nodes.
+
+        Parameters:
+            operator: binary operator to apply.
+            first: node of the first operand.
+            second: node of the second operand.
+
+        Returns:
+            The node that describes the given operator applied to the formulae
+            described by the given nodes.
+        """
+        function = _BINARY_OPERATORS[operator]
+        nodes = self._nodes
+        cache = self._cache
+        # An explicit stack of pairs of operands to apply the operator to, each
+        # of which is pushed again once the pairs of its low and high nodes
+        # have been pushed, to combine their results.
+        results = []
+        stack = [(first, second, False)]
+        while len(stack) > 0:
+            first, second, expanded = stack.pop()
+            key = (operator, first, second)
+            if expanded:
+                high = results.pop()
+                low = results.pop()
+                level = min(nodes[first][0], nodes[second][0])
+                result = self._node(level, low, high)
+                cache[key] = result
+                results.append(result)
+                continue
+            result = cache.get(key)
+            if result is None:
+                result = _terminal_case(operator, first, second)
+            if result is None and first <= BDD.TRUE and second <= BDD.TRUE:
+                result = BDD.TRUE if function(first == BDD.TRUE,
+                                              second == BDD.TRUE) \
+                         else BDD.FALSE
+            if result is not None:
+                results.append(result)
+                continue
+            first_level, first_low, first_high = nodes[first]
+            second_level, second_low, second_high = nodes[second]
+            if first_level > second_level:
+                first_low = first_high = first
+            elif second_level > first_level:
+                second_low = second_high = second
+            stack.append((first, second, True))
+            stack.append((first_high, second_high, False))
+            stack.append((first_low, second_low, False))
+        return results.pop()
+
+    def negate(self, node: int) -> int:
+        """Negates the given node.
+
+        Parameters:
+            node: node to negate.
+
+        Returns:
+            The node that describes the negation of the formula described by
+            the given node.
+        """
+        return self.apply('+', node, BDD.TRUE)
+
+    def build(self, formula: Formula) -> int:
+        """Builds the diagram of the given formula. Diagrams of all
+        subformulae are cached by the manager, so building a formula that
+        shares subformulae with previously built ones only builds the rest.
+
+        Parameters:
+            formula: formula to build the diagram of, all of whose variables
+                must be variables of the manager.
+
+        Returns:
+            The node that describes the given formula.
+        """
+        built = self._built
+        node = built.get(formula)
+        if node is not None:
+            return node
+        for subformula in formula.subformulae():
+            if subformula in built:
+                continue
+            root = subformula.root
+            if is_variable(root):
+                node = self._node(self._levels[root], BDD.FALSE, BDD.TRUE)
+            elif is_constant(root):
+                node = BDD.TRUE if root == 'T' else BDD.FALSE
+            elif is_unary(root):
+                node = self.negate(built[subformula.first])
+            else:
+                node = self.apply(root, built[subformula.first],
+                                  built[subformula.second])
+            built[subformula] = node
+        return built[formula]
+
+    def size(self, node: int) -> int:
+        """Computes the size of the diagram of the given node.
+
+        Parameters:
+            node: node to compute the size of.
+
+        Returns:
+            The number of nodes reachable from the given node, including itself
+            and the reachable terminal nodes.
+        """
+        nodes = self._nodes
+        reachable = {node}
+        stack = [node]
+        while len(stack) > 0:
+            current = stack.pop()
+            if current <= BDD.TRUE:
+                continue
+            for child in nodes[current][1:]:
+                if child not in reachable:
+                    reachable.add(child)
+                    stack.append(child)
+        return len(reachable)
+
+    def count_models(self, node: int) -> int:
+        """Counts the models over the variables of the manager in which the
+        formula described by the given node holds.
+
+        Parameters:
+            node: node to count the models of.
+
+        Returns:
+            The number of models of the given node.
+        """
+        nodes = self._nodes
+        counts = {BDD.FALSE: 0, BDD.TRUE: 1}
+        # The number of models of each node is counted over the variables
+        # from its level onward.
+        stack = [node]
+        while len(stack) > 0:
+            current = stack[-1]
+            if current in counts:
+                stack.pop()
+                continue
+            level, low, high = nodes[current]
+            if low in counts and high in counts:
+                stack.pop()
+                counts[current] = \
+                    (counts[low] << (nodes[low][0] - level - 1)) + \
+                    (counts[high] << (nodes[high][0] - level - 1))
+            else:
+                stack.append(low)
+                stack.append(high)
+        return counts[node] << nodes[node][0]
+
+    def models(self, node: int) -> Iterator[Dict[str, bool]]:
+        """Lazily enumerates the models over the variables of the manager in
+        which the formula described by the given node holds.
+
+        Parameters:
+            node: node to enumerate the models of.
+
+        Returns:
+            An iterator over the models of the given node, in the order in
+            which `~propositions.semantics.all_models` returns them for the
+            variables of the manager.
+        """
+        nodes = self._nodes
+        variables = self.variables
+        # Each entry of the stack is a node and the values of the variables
+        # before its level; the False branch is always popped first.
+        stack = [(node, ())]
+        while len(stack) > 0:
+            current, values = stack.pop()
+            if current == BDD.FALSE:
+                continue
+            level = len(values)
+            if level == len(variables):
+                yield dict(zip(variables, values))
+                continue
+            current_level, low, high = nodes[current]
+            if current_level > level:
+                low = high = current
+            stack.append((high, values + (True,)))
+            stack.append((low, values + (False,)))
+
+
+def _terminal_case(operator: str, first: int, second: int) -> Optional[int]:
+    """Applies the given binary operator to the given nodes without descending
+    into them, if one of them determines the result.
+
+    Parameters:
+        operator: binary operator to apply.
+        first: node of the first operand.
+        second: node of the second operand.
+
+    Returns:
+        The node that describes the given operator applied to the formulae
+        described by the given nodes, or ``None`` if it is not determined
+        immediately.
+    """
+    if operator == '&':
+        if first == BDD.FALSE or second == BDD.FALSE:
+            return BDD.FALSE
+        if first == BDD.TRUE or first == second:
+            return second
+        if second == BDD.TRUE:
+            return first
+    elif operator == '|':
+        if first == BDD.TRUE or second == BDD.TRUE:
+            return BDD.TRUE
+        if first == BDD.FALSE or first == second:
+            return second
+        if second == BDD.FALSE:
+            return first
+    elif operator == '->':
+        if first == BDD.FALSE or second == BDD.TRUE or first == second:
+            return BDD.TRUE
+        if first == BDD.TRUE:
+            return second
+    return None
+
+
+#: The maximal number of managers, each over different variables, that
+#: `formula_bdd` and `is_equivalent` keep for reuse.
+SHARED_MANAGERS = 16
+
+#: The managers kept by `shared_manager`, keyed by their variables, from the
+#: least recently used.
+_shared_managers = OrderedDict()
+
+
+def shared_manager(variables: Sequence[str]) -> BDD:
+    """Finds the shared manager over the given variables, creating it if
+    needed. Only the `SHARED_MANAGERS` most recently used shared managers are
+    kept.
+
+    Parameters:
+        variables: the variables of the manager, in the order in which they
+            are to be tested.
+
+    Returns:
+        The shared manager over the given variables.
+    """
+    key = tuple(variables)
+    manager = _shared_managers.get(key)
+    if manager is None:
+        manager = BDD(key)
+        _shared_managers[key] = manager
+        if len(_shared_managers) > SHARED_MANAGERS:
+            _shared_managers.popitem(last=False)
+    else:
+        _shared_managers.move_to_end(key)
+    return manager
+
+
+def formula_bdd(formula: Formula) -> Tuple[BDD, int]:
+    """Builds the diagram of the given formula over its variables in
+    alphabetical order, in the shared manager over these variables. The
+    diagram is cached by this manager, so semantic questions about the same
+    formula only build it once.
+
+    Parameters:
+        formula: formula to build the diagram of.
+
+    Returns:
+        The shared manager over the variables of the given formula, and the
+        node of this manager that describes the given formula.
+    """
+    manager = shared_manager(sorted(formula.variables()))
+    return manager, manager.build(formula)
+
+
+def is_equivalent(first: Formula, second: Formula) -> bool:
+    """Checks if the given formulae are equivalent, i.e., hold in exactly the
+    same models. The diagrams of the formulae are built in the shared manager
+    over their variables, so checking formulae whose diagrams were already
+    built there only compares their nodes.
+
+    Parameters:
+        first: first formula to check.
+        second: second formula to check.
+
+    Returns:
+        ``True`` if the given formulae are equivalent, ``False`` otherwise.
+    """
+    manager = shared_manager(sorted(first.variables() | second.variables()))
+    return manager.build(first) == manager.build(second)
@@ -0,0 +1,106 @@
+# (c) This file is part of the course
+# Mathematical Logic through Programming
+# by Gonczarowski and Nisan.
+# File name: propositions/bdd_test.py
+
+"""Tests for the propositions.bdd module."""
+
+import gc
+import weakref
+
+import propositions.bdd
+from propositions.syntax import *
+from propositions.semantics import *
+from propositions.bdd import *
+
+from propositions.semantics_test import many_fs, check_backend
+
+def test_models(debug=False):
+    for infix in many_fs:
+        formula = Formula.parse(infix)
+        if debug:
+            print('Testing the models of the diagram of', formula)
+        variables = sorted(formula.variables() | {'x', 'q'})
+        manager = BDD(variables)
+        node = manager.build(formula)
+        expected = [model for model in all_models(variables)
+                    if evaluate(formula, model)]
+        assert list(manager.models(node)) == expected
+        assert manager.count_models(node) == len(expected)
+        assert (node == BDD.TRUE) == is_tautology(formula)
+        assert (node == BDD.FALSE) == is_contradiction(formula)
+
+def test_equivalence(debug=False):
+    if debug:
+        print('Testing equivalence of diagrams')
+    manager = BDD(['p', 'q', 'r'])
+    first = manager.build(Formula.parse('((p->q)&(q->r))'))
+    second = manager.build(Formula.parse('~((p&~q)|(q&~r))'))
+    assert first == second
+    assert manager.build(Formula.parse('(p->r)')) != first
+    assert is_equivalent(Formula.parse('(p<->q)'), Formula.parse('~(p+q)'))
+    assert not is_equivalent(Formula.parse('(p->q)'),
+                             Formula.parse('(q->p)'))
+    assert is_equivalent(Formula.parse('(x|~x)'), Formula.parse('T'))
+
+def test_wide_formula(debug=False):
+    if debug:
+        print('Testing a diagram of a formula with 200 variables')
+    formula = Formula('p0')
+    for i in range(1, 200):
+        formula = Formula('+', formula, Formula('p' + str(i)))
+    manager, node = formula_bdd(formula)
+    assert manager.size(node) == 2 + 2 * 200 - 1
+    assert manager.count_models(node) == 2 ** 199
+    model = next(manager.models(node))
+    assert evaluate(formula, model)
+    assert not is_tautology(formula, 'bdd')
+    assert is_tautology(Formula('<->', formula, formula), 'bdd')
+
+def test_formula_bdd_cache(debug=False):
+    if debug:
+        print('Testing that shared managers neither keep formulae alive nor '
+              'accumulate')
+    formulae = []
+    for i in range(100):
+        formula = Formula('->', Formula('p' + str(i)), Formula('q' + str(i)))
+        manager, node = formula_bdd(formula)
+        assert formula_bdd(formula) == (manager, node)
+        formulae.append(weakref.ref(formula))
+    managers = [weakref.ref(manager)]
+    del formula, manager
+    gc.collect()
+    assert all(formula() is None for formula in formulae)
+    for i in range(100, 100 + 2 * propositions.bdd.SHARED_MANAGERS):
+        formula_bdd(Formula('p' + str(i)))
+    gc.collect()
+    assert managers[0]() is None
+
+def test_equivalence_reuse(debug=False):
+    if debug:
+        print('Testing that equivalence checks reuse built diagrams')
+    first = Formula('p0')
+    second = Formula('~', Formula('~', Formula('p0')))
+    for i in range(1, 100):
+        first = Formula('+', first, Formula('p' + str(i)))
+        second = Formula('~', Formula('<->', second, Formula('p' + str(i))))
+    assert is_equivalent(first, second)
+    assert not is_equivalent(first, Formula('~', second))
+    manager = shared_manager(sorted(first.variables()))
+    size = len(manager)
+    for _ in range(100):
+        assert is_equivalent(first, second)
+        assert not is_equivalent(first, Formula('~', second))
+    assert shared_manager(sorted(first.variables())) is manager
+    assert len(manager) == size
+
+def test_bdd_backend(debug=False):
+    check_backend('bdd', debug)
+
+def test_all(debug=False):
+    test_models(debug)
+    test_equivalence(debug)
+    test_wide_formula(debug)
+    test_formula_bdd_cache(debug)
+    test_equivalence_reuse(debug)
+    test_bdd_backend(debug)
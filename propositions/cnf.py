@@ -0,0 +1,225 @@
+# (c) This file is part of the course
+# Mathematical Logic through Programming
+# by Gonczarowski and Nisan.
+# File name: propositions/cnf.py
+
+"""Conversion of propositional formulae to equisatisfiable conjunctive normal
+form."""
+
+from __future__ import annotations
+from typing import Dict, List, Tuple
+
+from propositions.syntax import *
+
+
+class CNF:
+    """A mutable formula in conjunctive normal form, i.e., a conjunction of
+    clauses, each of which is a disjunction of literals.
+
+    Variables are numbered consecutively from ``1``, and the literals of a
+    variable `v` are `v` (the variable holds) and ``-``\\ `v` (the variable
+    does not hold). Propositional formulae are added using the Tseitin
+    encoding: every distinct compound subformula gets a fresh auxiliary
+    variable, constrained by a few clauses to equal the value of the
+    subformula. The resulting CNF is thus not equivalent to the added formulae,
+    but it is equisatisfiable with them, and its size is linear in theirs.
+
+    Attributes:
+        variables (`~typing.Dict`\\[`str`, `int`]): mapping from the variable
+            names of the added formulae to their variables.
+        variables_count (`int`): the number of variables, including auxiliary
+            ones.
+        clauses (`~typing.List`\\[`~typing.Tuple`\\[`int`, ...]]): the clauses.
+    """
+    variables: Dict[str, int]
+    variables_count: int
+    clauses: List[Tuple[int, ...]]
+
+    def __init__(self) -> None:
+        """Initializes an empty `CNF`, which holds in every model."""
+        self.variables = {}
+        self.variables_count = 0
+        self.clauses = []
+        self._literals = {}
+        self._true = None
+
+    def __repr__(self) -> str:
+        """Computes a string representation of the current CNF.
+
+        Returns:
+            A string representation of the current CNF.
+        """
+        return '&'.join('(' + '|'.join(str(literal) for literal in clause) +
+                        ')' for clause in self.clauses)
+
+    def new_variable(self) -> int:
+        """Adds a new auxiliary variable.
+
+        Returns:
+            The new variable.
+        """
+        self.variables_count += 1
+        return self.variables_count
+
+    def variable(self, name: str) -> int:
+        """Finds the variable of the given variable name, adding it if needed.
+
+        Parameters:
+            name: variable name to find the variable of.
+
+        Returns:
+            The variable of the given variable name.
+        """
+        assert is_variable(name)
+        if name not in self.variables:
+            self.variables[name] = self.new_variable()
+        return self.variables[name]
+
+    def encode(self, formula: Formula) -> int:
+        """Encodes the given formula without requiring it to hold.
+
+        Parameters:
+            formula: formula to encode.
+
+        Returns:
+            A literal that holds in a model of the current CNF if and only if
+            the given formula holds in the model of the variable names that this
+            model induces.
+        """
+        literals = self._literals
+        for subformula in formula.subformulae():
+            if subformula in literals:
+                continue
+            root = subformula.root
+            if is_variable(root):
+                literal = self.variable(root)
+            elif is_constant(root):
+                if self._true is None:
+                    self._true = self.new_variable()
+                    self.clauses.append((self._true,))
+                literal = self._true if root == 'T' else -self._true
+            elif is_unary(root):
+                literal = -literals[subformula.first]
+            else:
+                literal = self._encode_binary(root,
+                                              literals[subformula.first],
+                                              literals[subformula.second])
+            literals[subformula] = literal
+        return literals[formula]
+
+    def _encode_binary(self, operator: str, first: int, second: int) -> int:
+        """Adds clauses that define a fresh variable as the value of the given
+        binary operator applied to the given literals.
+
+        Parameters:
+            operator: binary operator to apply.
+            first: literal of the first operand.
+            second: literal of the second operand.
+
+        Returns:
+            A literal that holds if and only if the given operator, applied to
+            the given literals, holds.
+        """
+        if operator == '-&':
+            return -self._encode_binary('&', first, second)
+        if operator == '-|':
+            return -self._encode_binary('|', first, second)
+        if operator == '<->':
+            return -self._encode_binary('+', first, second)
+        if operator == '->':
+            return self._encode_binary('|', -first, second)
+        x = self.new_variable()
+        if operator == '&':
+            self.clauses.extend([(-x, first), (-x, second),
+                                 (x, -first, -second)])
+        elif operator == '|':
+            self.clauses.extend([(x, -first), (x, -second),
+                                 (-x, first, second)])
+        else:
+            assert operator == '+'
+            self.clauses.extend([(-x, first, second), (-x, -first, -second),
+                                 (x, -first, second), (x, first, -second)])
+        return x
+
+    def add_formula(self, formula: Formula) -> None:
+        """Requires the given formula to hold.
+
+        Parameters:
+            formula: formula to add.
+        """
+        self.clauses.append((self.encode(formula),))
+
+    def to_dimacs(self) -> str:
+        """Computes the DIMACS representation of the current CNF.
+
+        Returns:
+            The DIMACS representation of the current CNF, where the variable
+            names are recorded in comment lines of the form
+            ``c var`` `name` `variable`.
+        """
+        lines = ['c var ' + name + ' ' + str(variable)
+                 for name, variable in sorted(self.variables.items())]
+        lines.append('p cnf ' + str(self.variables_count) + ' ' +
+                     str(len(self.clauses)))
+        for clause in self.clauses:
+            lines.append(' '.join(str(literal) for literal in clause) + ' 0')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def parse_dimacs(s: str) -> CNF:
+        """Parses the given DIMACS representation into a CNF.
+
+        Parameters:
+            s: DIMACS representation to parse, such as returned by
+                `to_dimacs`, or produced by any other tool.
+
+        Returns:
+            A CNF with the clauses of the given DIMACS representation, and with
+            the variable names recorded in its ``c var`` comment lines, if any.
+        """
+        cnf = CNF()
+        clause = []
+        for line in s.splitlines():
+            tokens = line.split()
+            if len(tokens) == 0:
+                continue
+            if tokens[0] == 'c':
+                # Any other comment, even one that starts similarly, is
+                # ignored.
+                if len(tokens) == 4 and tokens[1] == 'var' and \
+                        is_variable(tokens[2]) and tokens[3].isdigit():
+                    cnf.variables[tokens[2]] = int(tokens[3])
+                continue
+            if tokens[0] == '%':
+                break
+            if tokens[0] == 'p':
+                assert tokens[1] == 'cnf', 'Expected a CNF problem line'
+                cnf.variables_count = int(tokens[2])
+                continue
+            for token in tokens:
+                literal = int(token)
+                if literal == 0:
+                    cnf.clauses.append(tuple(clause))
+                    clause = []
+                else:
+                    cnf.variables_count = max(cnf.variables_count,
+                                              abs(literal))
+                    clause.append(literal)
+        assert len(clause) == 0, 'Unterminated last clause'
+        return cnf
+
+
+def to_cnf(formula: Formula) -> CNF:
+    """Converts the given formula to an equisatisfiable CNF of linear size.
+
+    Parameters:
+        formula: formula to convert.
+
+    Returns:
+        A CNF that is satisfiable if and only if the given formula is. The
+        models of the returned CNF, restricted to the variables of the given
+        formula, are exactly the models of the given formula.
+    """
+    cnf = CNF()
+    cnf.add_formula(formula)
+    return cnf
@@ -0,0 +1,75 @@
+# (c) This file is part of the course
+# Mathematical Logic through Programming
+# by Gonczarowski and Nisan.
+# File name: propositions/cnf_test.py
+
+"""Tests for the propositions.cnf module."""
+
+from propositions.syntax import *
+from propositions.semantics import *
+from propositions.cnf import *
+
+from propositions.semantics_test import many_fs
+
+def cnf_models(cnf):
+    for values in all_models(['v' + str(v)
+                              for v in range(1, cnf.variables_count + 1)]):
+        values = list(values.values())
+        if all(any(values[abs(literal) - 1] == (literal > 0)
+                   for literal in clause)
+               for clause in cnf.clauses):
+            yield values
+
+def test_to_cnf(debug=False):
+    for infix in many_fs:
+        formula = Formula.parse(infix)
+        if debug:
+            print('Testing converting', formula, 'to CNF')
+        cnf = to_cnf(formula)
+        assert set(cnf.variables.keys()) == formula.variables()
+        projections = {frozenset((name, values[variable - 1])
+                                 for name, variable in cnf.variables.items())
+                       for values in cnf_models(cnf)}
+        expected = {frozenset(model.items())
+                    for model in all_models(sorted(formula.variables()))
+                    if evaluate(formula, model)}
+        assert projections == expected, infix
+
+def test_linear_size(debug=False):
+    if debug:
+        print('Testing that the CNF of a long chain of equivalences is linear')
+    formula = Formula('p0')
+    for i in range(1, 1000):
+        formula = Formula('<->' if i % 2 == 0 else '+', formula,
+                          Formula('p' + str(i)))
+    cnf = to_cnf(formula)
+    assert cnf.variables_count == 1999
+    assert len(cnf.clauses) == 4 * 999 + 1
+
+def test_dimacs(debug=False):
+    cnf = CNF()
+    cnf.add_formula(Formula.parse('((p->q)&~r)'))
+    cnf.add_formula(Formula.parse('(r|T)'))
+    dimacs = cnf.to_dimacs()
+    if debug:
+        print('Testing DIMACS round trip of', dimacs)
+    assert dimacs.startswith('c var p 1\nc var q 2\nc var r 4\np cnf ')
+    parsed = CNF.parse_dimacs(dimacs)
+    assert parsed.variables == cnf.variables
+    assert parsed.variables_count == cnf.variables_count
+    assert parsed.clauses == cnf.clauses
+    assert parsed.to_dimacs() == dimacs
+    parsed = CNF.parse_dimacs('c from some other tool\np cnf 3 2\n1 -3\n0 2 3\n'
+                              '-1 0\n%\n0\n')
+    assert parsed.variables == {}
+    assert parsed.variables_count == 3
+    assert parsed.clauses == [(1, -3), (2, 3, -1)]
+    parsed = CNF.parse_dimacs('c var foo bar\nc var foo 2\nc var q bar\n'
+                              'c var q 2\np cnf 2 1\n1 -2 0\n')
+    assert parsed.variables == {'q': 2}
+    assert parsed.clauses == [(1, -2)]
+
+def test_all(debug=False):
+    test_to_cnf(debug)
+    test_linear_size(debug)
+    test_dimacs(debug)
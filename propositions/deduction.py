@@ -5,6 +5,8 @@
 
 """Useful proof manipulation maneuvers in propositional logic."""
 
+from typing import Iterable, Iterator
+
 from propositions.syntax import *
 from propositions.proofs import *
 from propositions.axiomatic_systems import *
@@ -31,7 +33,7 @@ def prove_corollary(antecedent_proof: Proof, consequent: Formula,
         proof, via the same inference rules as the given proof and in addition
         `~propositions.axiomatic_systems.MP` and `conditional`.
     """
-    assert antecedent_proof.is_valid()
+    assert is_valid_by_policy(antecedent_proof)
     assert InferenceRule([],
                          Formula('->', antecedent_proof.statement.conclusion,
                                  consequent)).is_specialization_of(conditional)
@@ -58,7 +60,7 @@ def prove_corollary(antecedent_proof: Proof, consequent: Formula,
     new_line2 = Proof.Line(consequent, MP, [len(lines)-2, len(lines)-1])
     lines.append(new_line2)
 
-    return Proof(statement, rules, lines)
+    return mark_derived(Proof(statement, rules, lines))
 
 
 def combine_proofs(antecedent1_proof: Proof, antecedent2_proof: Proof,
@@ -85,8 +87,8 @@ def combine_proofs(antecedent1_proof: Proof, antecedent2_proof: Proof,
         proofs, via the same inference rules as the given proofs and in addition
         `~propositions.axiomatic_systems.MP` and `conditional`.
     """
-    assert antecedent1_proof.is_valid()
-    assert antecedent2_proof.is_valid()
+    assert is_valid_by_policy(antecedent1_proof)
+    assert is_valid_by_policy(antecedent2_proof)
     assert antecedent1_proof.statement.assumptions == \
            antecedent2_proof.statement.assumptions
     assert antecedent1_proof.rules == antecedent2_proof.rules
@@ -141,7 +143,7 @@ def combine_proofs(antecedent1_proof: Proof, antecedent2_proof: Proof,
     #print("____________________________________________")
     #print("Final proof:\n"+ str(p))
     #print("\n*********************************************************************************")
-    return p
+    return mark_derived(p)
 
 
 def remove_assumption(proof: Proof) -> Proof:
@@ -164,7 +166,7 @@ def remove_assumption(proof: Proof) -> Proof:
         `~propositions.axiomatic_systems.I1`, and
         `~propositions.axiomatic_systems.D`.
     """        
-    assert proof.is_valid()
+    assert is_valid_by_policy(proof)
     assert len(proof.statement.assumptions) > 0
     for rule in proof.rules:
         assert rule == MP or len(rule.assumptions) == 0
@@ -175,53 +177,99 @@ def remove_assumption(proof: Proof) -> Proof:
     conclusion = Formula('->', antecedent, consequent)
     assumptions = proof.statement.assumptions[:len(proof.statement.assumptions) - 1]
     statement = InferenceRule(assumptions, conclusion)
+    lines = remove_assumption_lines(proof.lines, antecedent)
+    return mark_derived(Proof(statement, proof.rules.union({MP, I0, I1, D}),
+                              lines))
 
-    lines = []
-    temp = [0]*len(proof.lines)
-    i = 0
-    for line in proof.lines:
-
-        if line.formula == antecedent:
-            formula = Formula('->', antecedent, line.formula)
-            lines.append(Proof.Line(formula, I0, []))
-
-        elif line.is_assumption():
-            lines.append(line)
-            temp_formula_2 = Formula('->', line.formula, Formula('->', antecedent, line.formula))
-            lines.append(Proof.Line(temp_formula_2, I1, []))
-            formula = Formula('->', antecedent, line.formula)
-            lines.append(Proof.Line(formula, MP, [len(lines)-2, len(lines)-1]))
-
-        elif not line.is_assumption():
-            if len(line.assumptions) == 0:
-                lines.append(line)
-                temp_formula_1 = Formula('->', antecedent, line.formula)
-                temp_formula_2 = Formula('->', line.formula, temp_formula_1)
-                lines.append(Proof.Line(temp_formula_2, I1, []))
-                lines.append(Proof.Line(temp_formula_1, MP, [len(lines)-2, len(lines)-1]))
-            else:
-                formula = lines[temp[line.assumptions[1]]].formula
-                temp_formula_1 = Formula('->', formula.first,  formula.second.first)
-                temp_formula_2 = Formula('->', formula.first, formula.second.second)
-                temp_formula_3 = Formula('->', temp_formula_1, temp_formula_2)
-                lines.append(Proof.Line(Formula('->', formula, temp_formula_3), D, []))
-                lines.append(Proof.Line(temp_formula_3, MP, [temp[line.assumptions[1]], len(lines)-1]))
-                formula_new = Formula('->', antecedent, line.formula)
-                lines.append(Proof.Line(formula_new, MP, [temp[line.assumptions[0]], len(lines)-1]))
-
-        temp[i] = len(lines)-1
-        i += 1
 
-    rules = []
-    for rule in proof.rules:
-        rules.append(rule)
-    rules.append(MP)
-    rules.append(I0)
-    rules.append(I1)
-    rules.append(D)
-    rules = set(rules)
+def remove_assumption_lines(lines: Iterable[Proof.Line],
+                            assumption: Formula) -> Iterator[Proof.Line]:
+    """Lazily converts the given lines of a proof that may use the given
+    assumption into lines of a proof of the implication by the assumption of
+    each of their formulae, which does not use that assumption.
+
+    Parameters:
+        lines: lines of a valid proof to convert, via some set of inference
+            rules all of which have no assumptions except perhaps
+            `~propositions.axiomatic_systems.MP`. These lines are consumed one
+            by one, so they need not be stored.
+        assumption: the assumption to remove.
 
-    return Proof(statement, rules, lines)
+    Returns:
+        An iterator over the lines of the converted proof, which yields for
+        every given line justifying a formula `formula`, as soon as it is
+        consumed, up to three lines, the last of which justifies
+        ``'(``\ `assumption`\ ``->``\ `formula`\ ``)'``, via the same
+        inference rules as the given lines and in addition
+        `~propositions.axiomatic_systems.MP`,
+        `~propositions.axiomatic_systems.I0`,
+        `~propositions.axiomatic_systems.I1`, and
+        `~propositions.axiomatic_systems.D`.
+    """
+    # The index of the last converted line of every given line, and the formula
+    # of every given line
+    line_numbers = []
+    formulae = []
+    count = 0
+    for line in lines:
+        implication = Formula('->', assumption, line.formula)
+        if line.formula == assumption:
+            yield Proof.Line(implication, I0, [])
+            count += 1
+        elif line.is_assumption() or len(line.assumptions) == 0:
+            yield line
+            yield Proof.Line(Formula('->', line.formula, implication), I1, [])
+            yield Proof.Line(implication, MP, [count, count + 1])
+            count += 3
+        else:
+            antecedent_line, conditional_line = line.assumptions
+            antecedent = formulae[antecedent_line]
+            conditional = Formula('->', assumption, formulae[conditional_line])
+            distributed = Formula('->', Formula('->', assumption, antecedent),
+                                  implication)
+            yield Proof.Line(Formula('->', conditional, distributed), D, [])
+            yield Proof.Line(distributed, MP,
+                             [line_numbers[conditional_line], count])
+            yield Proof.Line(implication, MP,
+                             [line_numbers[antecedent_line], count + 1])
+            count += 3
+        line_numbers.append(count - 1)
+        formulae.append(line.formula)
+
+
+def remove_assumptions(proof: Proof, count: int) -> Proof:
+    """Converts a proof of some `conclusion` formula, the last assumptions of
+    which are the given number of assumptions `assumption1`, ...,
+    `assumptionk`, into a proof of
+    ``'(``\ `assumption1`\ ``->``...\ ``(``\ `assumptionk`\ ``->``\ `conclusion`\ ``)``...\ ``)'``
+    from the same assumptions except these, in a single pass over the lines of
+    the given proof.
+
+    Parameters:
+        proof: valid proof to convert, with at least `count` assumptions, via
+            some set of inference rules all of which have no assumptions except
+            perhaps `~propositions.axiomatic_systems.MP`.
+        count: positive number of assumptions to remove.
+
+    Return:
+        The proof that `count` successive applications of `remove_assumption`
+        to the given proof would return.
+    """
+    assert is_valid_by_policy(proof)
+    assert 0 < count <= len(proof.statement.assumptions)
+    for rule in proof.rules:
+        assert rule == MP or len(rule.assumptions) == 0
+    assumptions = proof.statement.assumptions[:-count]
+    conclusion = proof.statement.conclusion
+    lines = proof.lines
+    # The lines of the given proof flow through one conversion per removed
+    # assumption, each of which consumes the lines of the previous one as
+    # they are yielded.
+    for assumption in reversed(proof.statement.assumptions[-count:]):
+        conclusion = Formula('->', assumption, conclusion)
+        lines = remove_assumption_lines(lines, assumption)
+    return mark_derived(Proof(InferenceRule(assumptions, conclusion),
+                              proof.rules.union({MP, I0, I1, D}), lines))
 
 
 def proof_from_inconsistency(proof_of_affirmation: Proof,
@@ -241,8 +289,8 @@ def proof_from_inconsistency(proof_of_affirmation: Proof,
         `~propositions.axiomatic_systems.MP` and
         `~propositions.axiomatic_systems.I2`.
     """
-    assert proof_of_affirmation.is_valid()
-    assert proof_of_negation.is_valid()
+    assert is_valid_by_policy(proof_of_affirmation)
+    assert is_valid_by_policy(proof_of_negation)
     assert proof_of_affirmation.statement.assumptions == \
            proof_of_negation.statement.assumptions
     assert Formula('~', proof_of_affirmation.statement.conclusion) == \
@@ -272,7 +320,7 @@ def prove_by_contradiction(proof: Proof) -> Proof:
         `~propositions.axiomatic_systems.D`, and
         `~propositions.axiomatic_systems.N`.
     """
-    assert proof.is_valid()
+    assert is_valid_by_policy(proof)
     assert proof.statement.conclusion == Formula.parse('~(p->p)')
     assert len(proof.statement.assumptions) > 0
     assert proof.statement.assumptions[-1].root == '~'
@@ -305,6 +353,6 @@ def prove_by_contradiction(proof: Proof) -> Proof:
     new_lines.append(last_line)
 
     new_statement = InferenceRule(assumptions, phi)
-    return Proof(new_statement, rules, new_lines)
+    return mark_derived(Proof(new_statement, rules, new_lines))
 
 
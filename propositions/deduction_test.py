@@ -206,6 +206,37 @@ def test_remove_assumption(debug=False):
         assert pp.rules.issubset(p.rules.union({MP,I0,I1,D}))
         assert pp.is_valid(), offending_line(pp)
 
+def test_remove_assumptions(debug=False):
+    assumptions = [Formula.parse('(p->q)'), Formula.parse('p'),
+                   Formula.parse('(q->r)')]
+    lines = [Proof.Line(assumptions[1]), Proof.Line(assumptions[0]),
+             Proof.Line(Formula.parse('q'), MP, [0, 1]),
+             Proof.Line(assumptions[2]),
+             Proof.Line(Formula.parse('(q->q)'), I0, []),
+             Proof.Line(Formula.parse('r'), MP, [2, 3])]
+    p = Proof(InferenceRule(assumptions, Formula.parse('r')), {MP, I0}, lines)
+    assert p.is_valid(), offending_line(p)
+    if debug:
+        print("Testing remove_assumption_lines on:", p)
+    converted = remove_assumption_lines(iter(lines), assumptions[-1])
+    assert str(next(converted)) == str(lines[0])
+    assert [str(line) for line in converted] == \
+           [str(line) for line in remove_assumption(p).lines[1:]]
+    for count in range(1, len(assumptions) + 1):
+        if debug:
+            print("Testing remove_assumptions with", count, "assumptions")
+        pp = remove_assumptions(p, count)
+        expected = p
+        for _ in range(count):
+            expected = remove_assumption(expected)
+        if debug:
+            print("Got:", pp)
+        assert pp.statement == expected.statement
+        assert pp.rules == expected.rules
+        assert [str(line) for line in pp.lines] == \
+               [str(line) for line in expected.lines]
+        assert pp.is_valid(), offending_line(pp)
+
 def test_proof_from_inconsistency(debug=False):
     assumptions = (Formula.parse('(~~p->~~q)'), Formula.parse('p'),
                    Formula.parse('~q'))
@@ -263,6 +294,7 @@ def test_ex5(debug=False):
     test_prove_corollary(debug)
     test_combine_proofs(debug)
     test_remove_assumption(debug)
+    test_remove_assumptions(debug)
     test_proof_from_inconsistency(debug)
     test_prove_by_contradiction(debug)
 
@@ -6,8 +6,9 @@
 """Proofs by deduction in propositional logic."""
 
 from __future__ import annotations
-from typing import AbstractSet, Iterable, FrozenSet, List, Mapping, Optional, \
-                   Set, Tuple, Union
+import random
+from typing import AbstractSet, Dict, Iterable, FrozenSet, List, Mapping, \
+                   Optional, Sequence, Set, Tuple, Union
 
 from logic_utils import frozen
 
@@ -68,7 +69,7 @@ class InferenceRule:
         return not self == other
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        return hash((self.assumptions, self.conclusion))
         
     def __repr__(self) -> str:
         """Computes a string representation of the current inference rule.
@@ -143,11 +144,13 @@ class InferenceRule:
 
         if specialization_map1 is None or specialization_map2 is None:
             return None
-        for key in specialization_map1:
-            if key in specialization_map2 and specialization_map1[key] != specialization_map2[key]:
+        merged = dict(specialization_map1)
+        for variable, formula in specialization_map2.items():
+            bound = merged.setdefault(variable, formula)
+            if bound != formula:
                 return None
-        return dict(specialization_map1, **specialization_map2)
-        
+        return merged
+
     @staticmethod
     def formula_specialization_map(general: Formula, specialization: Formula) \
             -> Union[SpecializationMap, None]:
@@ -163,26 +166,10 @@ class InferenceRule:
             in fact not a specialization of `general`.
         """
         # Task 4.5b
-        if is_variable(general.root):
-            return {general.root: specialization}
-
-        if is_constant(general.root):
-            if general.root == specialization.root:
-                return {}
-            else:
-                return None
-
-        if is_unary(general.root):
-            if not is_unary(specialization.root):
-                return None
-            return InferenceRule.formula_specialization_map(general.first, specialization.first)
-
-        if is_binary(general.root):
-            if general.root != specialization.root:
-                return None
-            map_of_first = InferenceRule.formula_specialization_map(general.first, specialization.first)
-            map_of_second = InferenceRule.formula_specialization_map(general.second, specialization.second)
-            return InferenceRule.merge_specialization_maps(map_of_first, map_of_second)
+        specialization_map = {}
+        if not _match(general, specialization, specialization_map):
+            return None
+        return specialization_map
 
     def specialization_map(self, specialization: InferenceRule) -> \
             Union[SpecializationMap, None]:
@@ -199,16 +186,14 @@ class InferenceRule:
         # Task 4.5c
         if len(self.assumptions) != len(specialization.assumptions):
             return None
-
-        specialization_map = InferenceRule.formula_specialization_map(self.conclusion, specialization.conclusion)
-
-        if len(self.assumptions) != 0:
-            for i in range(0, len(self.assumptions)):
-                temp = InferenceRule.formula_specialization_map(self.assumptions[i], specialization.assumptions[i])
-                if temp is None:
-                    return None
-                specialization_map = InferenceRule.merge_specialization_maps(specialization_map, temp)
-
+        specialization_map = {}
+        if not _match(self.conclusion, specialization.conclusion,
+                      specialization_map):
+            return None
+        for general, specialized in zip(self.assumptions,
+                                        specialization.assumptions):
+            if not _match(general, specialized, specialization_map):
+                return None
         return specialization_map
 
     def is_specialization_of(self, general: InferenceRule) -> bool:
@@ -225,6 +210,46 @@ class InferenceRule:
         return general.specialization_map(self) is not None
 
 
+def _match(general: Formula, specialization: Formula,
+           specialization_map: Dict[str, Formula]) -> bool:
+    """Matches the given formula against the given specialization, extending
+    the given specialization map in place.
+
+    Parameters:
+        general: non-specialized formula to match.
+        specialization: specialization to match against.
+        specialization_map: the variables of already-matched formulae that the
+            given formula is matched consistently with, mapped to their
+            specializations. Variables of the given formula that are not
+            already in the map are added to it.
+
+    Returns:
+        ``True`` if the given specialization is a specialization of the given
+        formula consistent with the given specialization map, ``False`` as soon
+        as a mismatch is found, in which case the map may have been partially
+        extended.
+    """
+    # An explicit stack of pairs of formulae to match, where bound variables
+    # are compared by identity before falling back to structural equality,
+    # which only matters for formulae that were created with interning off.
+    pending = [(general, specialization)]
+    while len(pending) > 0:
+        general, specialization = pending.pop()
+        root = general.root
+        if is_variable(root):
+            bound = specialization_map.setdefault(root, specialization)
+            if bound != specialization:
+                return False
+        elif root != specialization.root:
+            return False
+        elif is_binary(root):
+            pending.append((general.second, specialization.second))
+            pending.append((general.first, specialization.first))
+        elif is_unary(root):
+            pending.append((general.first, specialization.first))
+    return True
+
+
 @frozen
 class Proof:
     """A frozen deductive proof, comprised of a statement in the form of an
@@ -396,47 +421,359 @@ class Proof:
         """
         assert line_number < len(self.lines)
         # Task 4.6b
-        if self.lines[line_number].is_assumption():
-            if self.lines[line_number].formula not in self.statement.assumptions:
-                #print('A')
+        assumptions, matchers = self._validator()
+        return _is_line_valid(self.lines, line_number, assumptions, matchers)
+
+    def is_valid(self) -> bool:
+        """Checks if the current proof is a valid proof of its claimed statement
+        via its inference rules.
+
+        Returns:
+            ``True`` if the current proof is a valid proof of its claimed
+            statement via its inference rules, ``False`` otherwise.
+        """
+        # Task 4.6c
+        # The verdict is recorded on the (immutable) proof, so that a proof is
+        # never validated twice.
+        valid = self.__dict__.get('_valid')
+        if valid is None:
+            valid = self._is_valid()
+            object.__setattr__(self, '_valid', valid)
+        return valid
+
+    def _is_valid(self) -> bool:
+        """Checks if the current proof is a valid proof of its claimed statement
+        via its inference rules, regardless of any recorded verdict.
+
+        Returns:
+            ``True`` if the current proof is a valid proof of its claimed
+            statement via its inference rules, ``False`` otherwise.
+        """
+        if len(self.lines) == 0 or \
+                self.lines[-1].formula != self.statement.conclusion:
+            return False
+        assumptions, matchers = self._validator()
+        lines = self.lines
+        for line_number in range(len(lines)):
+            if not _is_line_valid(lines, line_number, assumptions, matchers):
                 return False
-            return True
+        return True
+
+    def _validator(self) -> Tuple[AbstractSet[Formula],
+                                  Mapping[InferenceRule, _RuleMatcher]]:
+        """Prepares the validation of the lines of the current proof, once per
+        proof.
+
+        Returns:
+            A pair of the set of assumptions of the statement of the current
+            proof, and a mapping from each allowed rule of the current proof to
+            its matcher.
+        """
+        validator = self.__dict__.get('_validator_cache')
+        if validator is None:
+            validator = (frozenset(self.statement.assumptions),
+                         {rule: _compile_rule(rule) for rule in self.rules})
+            object.__setattr__(self, '_validator_cache', validator)
+        return validator
+
+
+#: A compiled inference rule, as a pair of its number of assumptions and its
+#: matching program, which is the list of the nodes of the conclusion and of
+#: the assumptions of the rule in preorder. Each node is a pair of the root of
+#: the node and its number of operands, or ``-1`` for a variable, which binds
+#: or checks the variable rather than checking the root of the matched formula.
+_RuleMatcher = Tuple[int, List[Tuple[str, int]]]
+
+
+def _compile_rule(rule: InferenceRule) -> _RuleMatcher:
+    """Compiles the given inference rule for matching.
+
+    Parameters:
+        rule: inference rule to compile.
+
+    Returns:
+        The matcher of the given rule.
+    """
+    program = []
+    for formula in (rule.conclusion,) + rule.assumptions:
+        stack = [formula]
+        while len(stack) > 0:
+            formula = stack.pop()
+            if is_variable(formula.root):
+                program.append((formula.root, -1))
+            elif is_constant(formula.root):
+                program.append((formula.root, 0))
+            elif is_unary(formula.root):
+                program.append((formula.root, 1))
+                stack.append(formula.first)
+            else:
+                program.append((formula.root, 2))
+                stack.append(formula.second)
+                stack.append(formula.first)
+    return len(rule.assumptions), program
+
+
+def _is_line_valid(lines: Sequence[Proof.Line], line_number: int,
+                   assumptions: AbstractSet[Formula],
+                   matchers: Mapping[InferenceRule, _RuleMatcher]) -> bool:
+    """Checks if the specified line validly follows from its justifications.
+
+    Parameters:
+        lines: lines of the proof.
+        line_number: index of the line to check.
+        assumptions: the assumptions of the statement of the proof.
+        matchers: mapping from each allowed rule of the proof to its matcher.
 
-        if self.lines[line_number].rule not in self.rules:
-            #print('B')
+    Returns:
+        ``True`` if the specified line is valid, as defined by
+        `Proof.is_line_valid`, ``False`` otherwise.
+    """
+    line = lines[line_number]
+    if line.rule is None:
+        return line.formula in assumptions
+    matcher = matchers.get(line.rule)
+    if matcher is None:
+        return False
+    assumptions_count, program = matcher
+    if len(line.assumptions) != assumptions_count:
+        return False
+    targets = [line.formula]
+    for i in line.assumptions:
+        if i >= line_number:
             return False
+        targets.append(lines[i].formula)
+    return _matches(program, targets)
 
-        for i in self.lines[line_number].assumptions:
-            if i >= line_number:
-                #print('C')
-                return False
 
-        line_as_inference_rule = self.rule_for_line(line_number)
-        if not line_as_inference_rule.is_specialization_of(self.lines[line_number].rule):
-            #print('D')
+def _matches(program: List[Tuple[str, int]], targets: List[Formula]) -> bool:
+    """Checks if the given formulae match the given matching program.
+
+    Parameters:
+        program: matching program of a compiled inference rule.
+        targets: the conclusion followed by the assumptions to match, in order.
+            This list is consumed by the matching.
+
+    Returns:
+        ``True`` if the given formulae are the conclusion and assumptions of a
+        specialization of the compiled rule, ``False`` otherwise.
+    """
+    # The targets are matched against the program in preorder, and each
+    # variable is bound to the first formula it matches, after which the
+    # formulae it matches must be that same (interned) formula.
+    targets.reverse()
+    bindings = {}
+    for root, operands in program:
+        target = targets.pop()
+        if operands == -1:
+            bound = bindings.get(root)
+            if bound is None:
+                bindings[root] = target
+            elif bound != target:
+                return False
+        elif target.root != root:
             return False
+        elif operands == 2:
+            targets.append(target.second)
+            targets.append(target.first)
+        elif operands == 1:
+            targets.append(target.first)
+    return True
 
-        return True
+
+@frozen
+class ProofDAG:
+    """A frozen deductive proof in which identical lines are shared, comprised
+    of the statement and allowed inference rules of a flat `Proof`, the
+    distinct nodes of its lines, and the node of each of its lines.
+
+    A node is a `~Proof.Line` whose assumptions are indices of previous nodes
+    rather than of previous lines, so two lines that justify the same formula by
+    the same rule from the same nodes, such as the lines of a subproof that is
+    copied into several places of a flat proof, are the same node. A flat line
+    that uses a node as an assumption is taken to use the last previous line of
+    that node, and the few lines that use other lines of the same nodes are
+    recorded separately, so that the flat proof can be recovered exactly.
+
+    Attributes:
+        statement (`InferenceRule`): the statement of the proof.
+        rules (`~typing.AbstractSet`\\[`InferenceRule`]): the allowed rules of
+            the proof.
+        nodes (`~typing.Tuple`\\[`~Proof.Line`, ...]): the distinct nodes of
+            the proof, each of whose assumptions are indices of previous nodes.
+        lines (`~typing.Tuple`\\[`int`, ...]): the index of the node of each
+            line of the flat proof.
+    """
+    statement: InferenceRule
+    rules: FrozenSet[InferenceRule]
+    nodes: Tuple[Proof.Line, ...]
+    lines: Tuple[int, ...]
+
+    def __init__(self, proof: Proof) -> None:
+        """Initializes a `ProofDAG` from the given flat proof.
+
+        Parameters:
+            proof: flat proof to share the identical lines of, each of whose
+                lines may only specify previous lines as its assumptions.
+        """
+        self.statement = proof.statement
+        self.rules = proof.rules
+        nodes = []
+        node_numbers = {}
+        line_nodes = []
+        last_lines = {}
+        references = {}
+        for line_number, line in enumerate(proof.lines):
+            if line.is_assumption():
+                key = (line.formula, None, None)
+            else:
+                for i in line.assumptions:
+                    assert 0 <= i < line_number, \
+                        'Line ' + str(line_number) + \
+                        ' specifies a non-previous line as an assumption'
+                premises = tuple(line_nodes[i] for i in line.assumptions)
+                if tuple(last_lines[node] for node in premises) != \
+                        line.assumptions:
+                    references[line_number] = line.assumptions
+                key = (line.formula, line.rule, premises)
+            node_number = node_numbers.get(key)
+            if node_number is None:
+                node_number = len(nodes)
+                node_numbers[key] = node_number
+                nodes.append(Proof.Line(*key))
+            line_nodes.append(node_number)
+            last_lines[node_number] = line_number
+        self.nodes = tuple(nodes)
+        self.lines = tuple(line_nodes)
+        self._references = references
+
+    def __repr__(self) -> str:
+        """Computes a string representation of the current proof.
+
+        Returns:
+            A string representation of the current proof.
+        """
+        r = 'Proof DAG for ' + str(self.statement) + ' via inference rules:\n'
+        for rule in self.rules:
+            r += '  ' + str(rule) + '\n'
+        r += "Nodes:\n"
+        for i in range(len(self.nodes)):
+            r += ("%3d) " % i) + str(self.nodes[i]) + '\n'
+        return r
+
+    def to_proof(self) -> Proof:
+        """Recovers the flat proof of the current proof.
+
+        Returns:
+            The flat proof from which the current proof was initialized.
+        """
+        nodes = self.nodes
+        references = self._references
+        lines = []
+        last_lines = {}
+        for line_number, node_number in enumerate(self.lines):
+            node = nodes[node_number]
+            if node.is_assumption():
+                lines.append(node)
+            else:
+                assumptions = references.get(line_number)
+                if assumptions is None:
+                    assumptions = [last_lines[i] for i in node.assumptions]
+                lines.append(Proof.Line(node.formula, node.rule, assumptions))
+            last_lines[node_number] = line_number
+        return Proof(self.statement, self.rules, lines)
 
     def is_valid(self) -> bool:
         """Checks if the current proof is a valid proof of its claimed statement
-        via its inference rules.
+        via its inference rules, checking every node only once however many
+        lines share it.
 
         Returns:
-            ``True`` if the current proof is a valid proof of its claimed
-            statement via its inference rules, ``False`` otherwise.
+            ``True`` if the flat proof of the current proof is a valid proof of
+            its claimed statement via its inference rules, ``False`` otherwise.
         """
-        # Task 4.6c
-        for i in range(0, len(self.lines)):
-            if not self.is_line_valid(i):
+        if len(self.lines) == 0 or \
+                self.nodes[self.lines[-1]].formula != \
+                self.statement.conclusion:
+            return False
+        assumptions = frozenset(self.statement.assumptions)
+        matchers = {}
+        nodes = self.nodes
+        for node in nodes:
+            if node.rule is None:
+                if node.formula not in assumptions:
+                    return False
+                continue
+            matcher = matchers.get(node.rule)
+            if matcher is None:
+                if node.rule not in self.rules:
+                    return False
+                matcher = _compile_rule(node.rule)
+                matchers[node.rule] = matcher
+            assumptions_count, program = matcher
+            if len(node.assumptions) != assumptions_count:
+                return False
+            targets = [node.formula]
+            targets.extend(nodes[i].formula for i in node.assumptions)
+            if not _matches(program, targets):
                 return False
+        return True
 
-        if self.lines[len(self.lines)-1].formula != self.statement.conclusion:
-            return False
 
+# Chapter 5 tasks
+
+#: The policies by which proof transformations may validate the proofs given to
+#: them: ``'always'`` validates every given proof, ``'top_level'`` validates
+#: only given proofs that were not returned by proof transformations,
+#: ``'sampled'`` validates a random `VALIDATION_SAMPLE_RATE` fraction of the
+#: given proofs, and ``'never'`` validates none of them.
+VALIDATION_POLICIES = ('always', 'top_level', 'sampled', 'never')
+
+#: The policy by which proof transformations validate the proofs given to them,
+#: out of `VALIDATION_POLICIES`.
+VALIDATION_POLICY = 'always'
+
+#: The fraction of the given proofs that the ``'sampled'`` policy validates.
+VALIDATION_SAMPLE_RATE = 0.1
+
+
+def is_valid_by_policy(proof: Proof) -> bool:
+    """Checks if the given proof, given to a proof transformation, is valid to
+    the extent required by `VALIDATION_POLICY`. A proof is never validated more
+    than once, whatever the policy.
+
+    Parameters:
+        proof: proof to check.
+
+    Returns:
+        ``False`` if the given proof was validated according to the policy and
+        found invalid, ``True`` otherwise.
+    """
+    assert VALIDATION_POLICY in VALIDATION_POLICIES
+    if VALIDATION_POLICY == 'never':
+        return True
+    if VALIDATION_POLICY == 'top_level' and \
+            proof.__dict__.get('_derived', False):
         return True
+    if VALIDATION_POLICY == 'sampled' and \
+            '_valid' not in proof.__dict__ and \
+            random.random() >= VALIDATION_SAMPLE_RATE:
+        return True
+    return proof.is_valid()
 
-# Chapter 5 tasks
+
+def mark_derived(proof: Proof) -> Proof:
+    """Marks the given proof as returned by a proof transformation from proofs
+    given to it, so that the ``'top_level'`` validation policy does not
+    validate it again.
+
+    Parameters:
+        proof: proof to mark.
+
+    Returns:
+        The given proof.
+    """
+    object.__setattr__(proof, '_derived', True)
+    return proof
 
 
 def prove_specialization(proof: Proof, specialization: InferenceRule) -> Proof:
@@ -451,7 +788,7 @@ def prove_specialization(proof: Proof, specialization: InferenceRule) -> Proof:
         A valid proof of the given specialization via the same inference rules
         as the given proof.
     """
-    assert proof.is_valid()
+    assert is_valid_by_policy(proof)
     assert specialization.is_specialization_of(proof.statement)
     # Task 5.1
     sp_map = proof.statement.specialization_map(specialization)
@@ -469,7 +806,7 @@ def prove_specialization(proof: Proof, specialization: InferenceRule) -> Proof:
         else:
             new_lines.append(Proof.Line(new_formula, None, None))
 
-    return Proof(new_statement, new_rules, new_lines)
+    return mark_derived(Proof(new_statement, new_rules, new_lines))
 
 
 def inline_proof_once(main_proof: Proof, line_number: int, lemma_proof: Proof) -> Proof:
@@ -496,7 +833,7 @@ def inline_proof_once(main_proof: Proof, line_number: int, lemma_proof: Proof) -
         returned proof than in `main_proof`).
     """
     assert main_proof.lines[line_number].rule == lemma_proof.statement
-    assert lemma_proof.is_valid()
+    assert is_valid_by_policy(lemma_proof)
     # Task 5.2a
     pre_inline = list(main_proof.lines[:line_number])
     post_inline = list(main_proof.lines[line_number+1:])
@@ -559,7 +896,79 @@ def inline_proof_once(main_proof: Proof, line_number: int, lemma_proof: Proof) -
     new_rules = set(new_rules)
 
     new_statement = InferenceRule(tuple(assumptions), main_proof.statement.conclusion)
-    return Proof(new_statement, new_rules, new_lines)
+    return mark_derived(Proof(new_statement, new_rules, new_lines))
+
+
+def _inline_lines(main_proof: Proof, line_numbers: AbstractSet[int],
+                  lemma_proof: Proof) -> List[Proof.Line]:
+    """Inlines the given proof of a "lemma" inference rule in lieu of all of the
+    specified lines of the given proof, in a single pass over the lines.
+
+    Parameters:
+        main_proof: valid proof to inline into.
+        line_numbers: indices of lines of `main_proof` that specify the "lemma"
+            inference rule proved by `lemma_proof` as their justification.
+        lemma_proof: valid proof of the "lemma" inference rule.
+
+    Returns:
+        The lines of `main_proof`, where each specified line is replaced with
+        the lines of the specialization of `lemma_proof` that concludes its
+        formula, except for the assumption lines of that specialization, which
+        are replaced with references to the lines that the specified line
+        specifies as its assumptions. The line indices specified throughout are
+        updated accordingly.
+    """
+    lemma = lemma_proof.statement
+    # For each assumption line of the lemma proof, the index of its formula
+    # among the assumptions of the lemma.
+    lemma_assumptions = [None if not line.is_assumption()
+                         else lemma.assumptions.index(line.formula)
+                         for line in lemma_proof.lines]
+    specialized_lemmas = {}
+    # The index in the new lines of the line that justifies the formula of each
+    # line of the main proof.
+    new_numbers = []
+    new_lines = []
+    for line_number, line in enumerate(main_proof.lines):
+        if line_number not in line_numbers:
+            if not line.is_assumption():
+                line = Proof.Line(line.formula, line.rule,
+                                  [new_numbers[i] for i in line.assumptions])
+            new_numbers.append(len(new_lines))
+            new_lines.append(line)
+            continue
+        assert line.rule == lemma
+        specialization_map = {}
+        matched = _match(lemma.conclusion, line.formula, specialization_map)
+        for general, i in zip(lemma.assumptions, line.assumptions):
+            matched = matched and _match(general, main_proof.lines[i].formula,
+                                         specialization_map)
+        assert matched
+        # The lemma proof is specialized once per distinct specialization.
+        key = tuple(sorted(specialization_map.items()))
+        formulae = specialized_lemmas.get(key)
+        if formulae is None:
+            formulae = [lemma_line.formula.substitute_variables(
+                            specialization_map)
+                        for lemma_line in lemma_proof.lines]
+            specialized_lemmas[key] = formulae
+        lemma_numbers = []
+        for lemma_line, formula, assumption in zip(lemma_proof.lines, formulae,
+                                                   lemma_assumptions):
+            if assumption is not None:
+                lemma_numbers.append(
+                    new_numbers[line.assumptions[assumption]])
+            else:
+                lemma_numbers.append(len(new_lines))
+                new_lines.append(Proof.Line(
+                    formula, lemma_line.rule,
+                    [lemma_numbers[i] for i in lemma_line.assumptions]))
+        new_numbers.append(lemma_numbers[-1])
+    if new_numbers[-1] != len(new_lines) - 1:
+        # The last line was replaced with a reference to an earlier line, so
+        # that earlier line is repeated to conclude the proof.
+        new_lines.append(new_lines[new_numbers[-1]])
+    return new_lines
 
 
 def inline_proof(main_proof: Proof, lemma_proof: Proof) -> Proof:
@@ -581,21 +990,57 @@ def inline_proof(main_proof: Proof, lemma_proof: Proof) -> Proof:
         `lemma_proof`.
     """
     # Task 5.2b
-    proof = main_proof
-    shift_size = len(lemma_proof.lines)-1
-    i = 0
-    while i < (len(proof.lines)):
-        if not proof.lines[i].is_assumption():
-            if proof.rule_for_line(i).is_specialization_of(lemma_proof.statement):
-                proof = inline_proof_once(proof, i, lemma_proof)
-                i += shift_size
-                continue
-        i += 1
+    assert is_valid_by_policy(lemma_proof)
+    line_numbers = {line_number
+                    for line_number, line in enumerate(main_proof.lines)
+                    if line.rule == lemma_proof.statement}
+    rules = set(main_proof.rules.union(lemma_proof.rules))
+    rules.discard(lemma_proof.statement)
+    return mark_derived(Proof(main_proof.statement, rules,
+                              _inline_lines(main_proof, line_numbers,
+                                            lemma_proof)))
+
+
+def compact(proof: Proof) -> Proof:
+    """Removes the redundant lines of the given proof, such as those left by
+    copying subproofs into it: every line that justifies a formula already
+    justified by a previous line is merged into the first line that justifies
+    that formula, and then every line that is not used, directly or
+    indirectly, to justify the conclusion is removed.
 
-    new_rules = []
-    for rule in proof.rules:
-        if rule != lemma_proof.statement:
-            new_rules.append(rule)
-    for rule in lemma_proof.rules:
-        new_rules.append(rule)
-    return Proof(proof.statement, set(new_rules), proof.lines)
+    Parameters:
+        proof: valid proof to compact.
+
+    Returns:
+        A valid proof of the same statement via the same inference rules, whose
+        lines are a subsequence of those of the given proof, with the indices
+        of their assumptions renumbered accordingly.
+    """
+    assert is_valid_by_policy(proof)
+    lines = proof.lines
+    if len(lines) == 0:
+        return proof
+    # The first line that justifies the formula of each line
+    firsts = {}
+    representatives = [firsts.setdefault(line.formula, line_number)
+                       for line_number, line in enumerate(lines)]
+    used = [False] * len(lines)
+    last = representatives[-1]
+    used[last] = True
+    for line_number in range(last, -1, -1):
+        if used[line_number] and not lines[line_number].is_assumption():
+            for i in lines[line_number].assumptions:
+                used[representatives[i]] = True
+    new_line_numbers = {}
+    new_lines = []
+    for line_number in range(last + 1):
+        if not used[line_number]:
+            continue
+        line = lines[line_number]
+        if not line.is_assumption():
+            line = Proof.Line(line.formula, line.rule,
+                              [new_line_numbers[representatives[i]]
+                               for i in line.assumptions])
+        new_line_numbers[line_number] = len(new_lines)
+        new_lines.append(line)
+    return mark_derived(Proof(proof.statement, proof.rules, new_lines))
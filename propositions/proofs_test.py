@@ -7,6 +7,7 @@
 
 from logic_utils import frozendict
 
+import propositions.proofs
 from propositions.syntax import *
 from propositions.proofs import *
 
@@ -192,6 +193,24 @@ rules = [
     ['p', '~T', ['(p->q)', '(p&p)'], ['(~T->(r&~z))','(~F&~F)'], None]
 ]
      
+def test_formula_specialization_map_deep(debug=False):
+    if debug:
+        print('Testing specialization maps of deep formulae')
+    general = Formula('p')
+    specialization = Formula('x')
+    for i in range(10000):
+        general = Formula('->', Formula('q' + str(i % 3)), general)
+        specialization = Formula('->', Formula('~', Formula('y' + str(i % 3))),
+                                 specialization)
+    assert InferenceRule.formula_specialization_map(general, specialization) \
+           == {'p': Formula('x'), 'q0': Formula.parse('~y0'),
+               'q1': Formula.parse('~y1'), 'q2': Formula.parse('~y2')}
+    specialization = Formula('->', Formula('~', Formula('y1')),
+                             specialization)
+    general = Formula('->', Formula('q0'), general)
+    assert InferenceRule.formula_specialization_map(general,
+                                                    specialization) is None
+
 def test_specialization_map(debug=False):
     for t in rules:
         g = InferenceRule([Formula.parse(f) for f in t[2]], Formula.parse(t[0]))
@@ -525,6 +544,62 @@ def test_is_valid(debug=False):
 
 # Tests for Chapter 5 tasks
 
+def test_is_valid_long_proof(debug=False):
+    if debug:
+        print('Testing validity of a proof with 100000 lines')
+    mp = InferenceRule([Formula.parse('p'), Formula.parse('(p->q)')],
+                       Formula.parse('q'))
+    formulae = [Formula('x' + str(i)) for i in range(50001)]
+    assumptions = [formulae[0]] + \
+                  [Formula('->', formulae[i], formulae[i + 1])
+                   for i in range(50000)]
+    lines = [Proof.Line(formulae[0])]
+    for i in range(50000):
+        lines.append(Proof.Line(assumptions[i + 1]))
+        lines.append(Proof.Line(formulae[i + 1], mp,
+                                [len(lines) - 2, len(lines) - 1]))
+    proof = Proof(InferenceRule(assumptions, formulae[-1]), {mp}, lines)
+    assert proof.is_valid()
+    assert proof.is_line_valid(len(lines) - 1)
+    lines[-1] = Proof.Line(formulae[-1], mp, [len(lines) - 2, len(lines) - 4])
+    assert not Proof(proof.statement, proof.rules, lines).is_valid()
+    lines[-1] = Proof.Line(formulae[-1], mp, [len(lines) - 3, len(lines) - 2])
+    assert Proof(proof.statement, proof.rules, lines).is_valid()
+    lines[-1] = Proof.Line(formulae[-1], mp, [len(lines) - 3])
+    assert not Proof(proof.statement, proof.rules, lines).is_valid()
+
+def test_proof_dag(debug=False):
+    if debug:
+        print('Testing sharing identical lines of a proof')
+    lines = list(DISJUNCTION_COMMUTATIVITY_PROOF.lines)
+    for _ in range(3):
+        offset = len(lines)
+        lines.extend(line if line.is_assumption() else
+                     Proof.Line(line.formula, line.rule,
+                                [i + offset for i in line.assumptions])
+                     for line in DISJUNCTION_COMMUTATIVITY_PROOF.lines)
+    # A line that uses an identical line that is not the last one
+    lines.append(Proof.Line(Formula.parse('(y|x)'), R1, [0, 1]))
+    proof = Proof(DISJUNCTION_COMMUTATIVITY_PROOF.statement,
+                  DISJUNCTION_COMMUTATIVITY_PROOF.rules, lines)
+    dag = ProofDAG(proof)
+    if debug:
+        print('Got:', dag)
+    assert len(dag.nodes) == len(DISJUNCTION_COMMUTATIVITY_PROOF.lines)
+    assert len(dag.lines) == len(lines)
+    flat = dag.to_proof()
+    assert flat.statement == proof.statement
+    assert flat.rules == proof.rules
+    assert [str(line) for line in flat.lines] == \
+           [str(line) for line in lines]
+    assert dag.is_valid() and flat.is_valid()
+    for rules in [set(), {R1}]:
+        assert not ProofDAG(Proof(proof.statement, rules, lines)).is_valid()
+    assert not ProofDAG(Proof(InferenceRule([], Formula.parse('(y|x)')),
+                              proof.rules, lines)).is_valid()
+    assert not ProofDAG(Proof(proof.statement, proof.rules,
+                              lines[:-2])).is_valid()
+
 def offending_line(proof):
     """Finds the first invalid line in the given proof.
 
@@ -874,20 +949,137 @@ def test_inline_proof(debug=False):
     assert inlined_proof.is_valid(), offending_line(inlined_proof)
 
 
+def test_inline_proof_many_uses(debug=False):
+    if debug:
+        print('Testing inlining a lemma used 10000 times')
+    lemma_proof = DISJUNCTION_RIGHT_ASSOCIATIVITY_PROOF
+    lemma = lemma_proof.statement
+    formulae = [Formula.parse('(p|(q|r))'), Formula.parse('((p|q)|r)')]
+    lines = [Proof.Line(formulae[1])]
+    for i in range(10000):
+        lines.append(Proof.Line(formulae[0], lemma, [len(lines) - 1]))
+        lines.append(Proof.Line(formulae[1], R4, [len(lines) - 1]))
+    proof = Proof(InferenceRule([formulae[1]], formulae[1]), {lemma, R4},
+                  lines)
+    assert proof.is_valid()
+    inlined_proof = inline_proof(proof, lemma_proof)
+    assert inlined_proof.statement == proof.statement
+    assert inlined_proof.rules == {R3, R4}
+    assert len(inlined_proof.lines) == 1 + 10000 * 6
+    assert inlined_proof.is_valid(), offending_line(inlined_proof)
+
+def test_compact(debug=False):
+    if debug:
+        print('Testing compacting proofs')
+    proof = Proof(DISJUNCTION_COMMUTATIVITY_PROOF.statement,
+                  DISJUNCTION_COMMUTATIVITY_PROOF.rules,
+                  [Proof.Line(Formula.parse('(~x|x)'), R2, []),
+                   Proof.Line(Formula.parse('(~y|y)'), R2, []),
+                   Proof.Line(Formula.parse('(x|y)')),
+                   Proof.Line(Formula.parse('(~x|x)'), R2, []),
+                   Proof.Line(Formula.parse('(y|x)'), R1, [2, 3])])
+    assert proof.is_valid()
+    compacted = compact(proof)
+    if debug:
+        print('Got:', compacted)
+    assert compacted.statement == proof.statement
+    assert compacted.rules == proof.rules
+    assert [str(line) for line in compacted.lines] == \
+           [str(line) for line in [proof.lines[0], proof.lines[2],
+                                   Proof.Line(Formula.parse('(y|x)'), R1,
+                                              [1, 0])]]
+    assert compacted.is_valid(), offending_line(compacted)
+
+    lemma_proof = DISJUNCTION_RIGHT_ASSOCIATIVITY_PROOF
+    formulae = [Formula.parse('(p|(q|r))'), Formula.parse('((p|q)|r)')]
+    lines = [Proof.Line(formulae[1])]
+    for i in range(1000):
+        lines.append(Proof.Line(formulae[0], lemma_proof.statement,
+                                [len(lines) - 1]))
+        lines.append(Proof.Line(formulae[1], R4, [len(lines) - 1]))
+    lines.append(Proof.Line(formulae[0], lemma_proof.statement,
+                            [len(lines) - 1]))
+    proof = inline_proof(Proof(InferenceRule([formulae[1]], formulae[0]),
+                               {lemma_proof.statement, R4}, lines),
+                         lemma_proof)
+    assert proof.is_valid()
+    compacted = compact(proof)
+    assert compacted.statement == proof.statement
+    assert len(compacted.lines) == len(lemma_proof.lines)
+    assert compacted.is_valid(), offending_line(compacted)
+
+def test_validation_policy(debug=False):
+    if debug:
+        print('Testing the validation policies of proof transformations')
+    lemma_proof = DISJUNCTION_RIGHT_ASSOCIATIVITY_PROOF
+    main_proof = Proof(InferenceRule([Formula.parse('((p|q)|r)')],
+                                     Formula.parse('(p|(q|r))')),
+                       {lemma_proof.statement},
+                       [Proof.Line(Formula.parse('((p|q)|r)')),
+                        Proof.Line(Formula.parse('(p|(q|r))'),
+                                   lemma_proof.statement, [0])])
+    def invalid_proof():
+        return Proof(lemma_proof.statement, lemma_proof.rules,
+                     lemma_proof.lines[:-1])
+    policy = propositions.proofs.VALIDATION_POLICY
+    sample_rate = propositions.proofs.VALIDATION_SAMPLE_RATE
+    try:
+        for new_policy, validates, validates_derived in \
+                [('always', True, True), ('top_level', True, False),
+                 ('never', False, False)]:
+            propositions.proofs.VALIDATION_POLICY = new_policy
+            assert is_valid_by_policy(invalid_proof()) != validates
+            assert is_valid_by_policy(mark_derived(invalid_proof())) != \
+                   validates_derived
+        propositions.proofs.VALIDATION_POLICY = 'sampled'
+        propositions.proofs.VALIDATION_SAMPLE_RATE = 0
+        proof = invalid_proof()
+        assert is_valid_by_policy(proof)
+        assert not proof.is_valid()
+        # A proof that is known to be invalid is always rejected.
+        assert not is_valid_by_policy(proof)
+        propositions.proofs.VALIDATION_SAMPLE_RATE = 1
+        assert not is_valid_by_policy(invalid_proof())
+        propositions.proofs.VALIDATION_POLICY = 'top_level'
+        inlined_proof = inline_proof(main_proof, lemma_proof)
+        assert inlined_proof.is_valid()
+        assert is_valid_by_policy(inline_proof(main_proof, lemma_proof))
+        propositions.proofs.VALIDATION_POLICY = 'never'
+        compacted = compact(invalid_proof())
+        propositions.proofs.VALIDATION_POLICY = 'top_level'
+        assert is_valid_by_policy(compacted)
+        propositions.proofs.VALIDATION_POLICY = 'always'
+        assert not is_valid_by_policy(compacted)
+        try:
+            compact(invalid_proof())
+        except AssertionError:
+            pass
+        else:
+            assert False, 'compact should reject an invalid proof'
+    finally:
+        propositions.proofs.VALIDATION_POLICY = policy
+        propositions.proofs.VALIDATION_SAMPLE_RATE = sample_rate
+
 def test_ex4(debug=False):
     test_variables(debug)
     test_specialize(debug)
     test_merge_specialization_maps(debug)
     test_formula_specialization_map(debug)
+    test_formula_specialization_map_deep(debug)
     test_specialization_map(debug)
     test_rule_for_line(debug)
     test_is_line_valid(debug)
     test_is_valid(debug)
+    test_is_valid_long_proof(debug)
+    test_proof_dag(debug)
 
 def test_ex5(debug=False):
     test_prove_specialization(debug)
     test_inline_proof_once(debug)
     test_inline_proof(debug)
+    test_inline_proof_many_uses(debug)
+    test_compact(debug)
+    test_validation_policy(debug)
 
 def test_all(debug=False):
     test_ex4(debug)
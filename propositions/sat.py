@@ -0,0 +1,543 @@
+# (c) This file is part of the course
+# Mathematical Logic through Programming
+# by Gonczarowski and Nisan.
+# File name: propositions/sat.py
+
+"""Satisfiability checking of propositional formulae by conflict-driven clause
+learning."""
+
+from heapq import heapify, heappop, heappush
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from propositions.syntax import *
+from propositions.cnf import *
+
+
+class Solver:
+    """A conflict-driven clause-learning (CDCL) satisfiability solver for
+    formulae in conjunctive normal form.
+
+    Variables are numbered consecutively from ``1``, and the literals of a
+    variable `v` are `v` (the variable holds) and ``-``\\ `v` (the variable
+    does not hold). Each clause (a disjunction of literals) is watched by its
+    first two literals, so that unit propagation only visits the clauses one
+    of whose watched literals has just become false. Conflicts are analyzed
+    into learned clauses at the first unique implication point, decisions
+    follow variable activities with saved phases, and the search restarts
+    according to the Luby sequence. The search may be run under temporary
+    assumptions, so that the same solver, with all of its learned clauses,
+    answers many related questions.
+
+    Attributes:
+        variables_count (`int`): the number of variables of the solver.
+        unsatisfiable (`bool`): whether the clauses added to the solver are
+            known to be unsatisfiable.
+    """
+    variables_count: int
+    unsatisfiable: bool
+
+    #: The number of conflicts in the first run of the search between two
+    #: restarts; later runs are longer according to the Luby sequence.
+    RESTART_BASE = 100
+    #: The factor by which the activity increment grows after every conflict.
+    ACTIVITY_GROWTH = 1 / 0.95
+
+    def __init__(self) -> None:
+        """Initializes a `Solver` with no variables and no clauses."""
+        self.variables_count = 0
+        self.unsatisfiable = False
+        self._clauses = []
+        self._watches = {}
+        self._values = {}
+        self._levels = [0]
+        self._reasons = [None]
+        self._activities = [0.0]
+        self._phases = [False]
+        self._activity_increment = 1.0
+        self._queue = []
+        self._trail = []
+        self._trail_limits = []
+        self._propagated = 0
+        self._model = None
+        self._core = None
+
+    def new_variable(self) -> int:
+        """Adds a new variable to the solver.
+
+        Returns:
+            The new variable.
+        """
+        self.variables_count += 1
+        variable = self.variables_count
+        self._watches[variable] = []
+        self._watches[-variable] = []
+        self._levels.append(0)
+        self._reasons.append(None)
+        self._activities.append(0.0)
+        self._phases.append(False)
+        heappush(self._queue, (0.0, variable))
+        return variable
+
+    def add_clause(self, literals: Iterable[int]) -> bool:
+        """Adds the given clause to the solver.
+
+        Parameters:
+            literals: the literals of the clause, over variables of the solver.
+
+        Returns:
+            ``False`` if the clauses of the solver are now known to be
+            unsatisfiable, ``True`` otherwise.
+        """
+        self._backtrack(0)
+        clause = []
+        members = set()
+        for literal in literals:
+            assert literal != 0 and abs(literal) <= self.variables_count
+            value = self._values.get(literal)
+            if value is True or -literal in members:
+                # The clause is already satisfied.
+                return not self.unsatisfiable
+            if value is None and literal not in members:
+                clause.append(literal)
+                members.add(literal)
+        if self.unsatisfiable:
+            return False
+        if len(clause) == 0:
+            self.unsatisfiable = True
+        elif len(clause) == 1:
+            self._assign(clause[0], None)
+            if self._propagate() is not None:
+                self.unsatisfiable = True
+        else:
+            self._watches[clause[0]].append(len(self._clauses))
+            self._watches[clause[1]].append(len(self._clauses))
+            self._clauses.append(clause)
+        return not self.unsatisfiable
+
+    def solve(self, assumptions: Sequence[int] = ()) -> bool:
+        """Searches for an assignment to the variables of the solver that
+        satisfies all of its clauses and the given assumptions.
+
+        Parameters:
+            assumptions: literals over variables of the solver that are to
+                hold only in the current search. They are decided before any
+                other variable, so that the clauses learned from conflicts hold
+                regardless of the assumptions.
+
+        Returns:
+            ``True`` if such an assignment was found, in which case it is
+            available through `value`, ``False`` if there is no such
+            assignment, in which case the assumptions that the clauses
+            contradict are available through `core`.
+        """
+        self._model = None
+        self._core = None
+        if self.unsatisfiable:
+            self._core = []
+            return False
+        restarts = 0
+        conflicts_until_restart = self.RESTART_BASE * _luby(restarts)
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                if len(self._trail_limits) == 0:
+                    self.unsatisfiable = True
+                    self._core = []
+                    return False
+                learned, level = self._analyze(conflict)
+                self._backtrack(level)
+                if len(learned) == 1:
+                    self._assign(learned[0], None)
+                else:
+                    self._watches[learned[0]].append(len(self._clauses))
+                    self._watches[learned[1]].append(len(self._clauses))
+                    self._clauses.append(learned)
+                    self._assign(learned[0], len(self._clauses) - 1)
+                self._activity_increment *= self.ACTIVITY_GROWTH
+                conflicts_until_restart -= 1
+                continue
+            if conflicts_until_restart <= 0:
+                restarts += 1
+                conflicts_until_restart = self.RESTART_BASE * _luby(restarts)
+                self._backtrack(0)
+                continue
+            # The first decision levels are those of the assumptions, where an
+            # assumption that already holds gets an empty decision level.
+            decision = None
+            while len(self._trail_limits) < len(assumptions):
+                literal = assumptions[len(self._trail_limits)]
+                value = self._values.get(literal)
+                if value is False:
+                    self._core = self._analyze_assumption(literal)
+                    self._backtrack(0)
+                    return False
+                self._trail_limits.append(len(self._trail))
+                if value is None:
+                    decision = literal
+                    break
+            if decision is None:
+                variable = self._pick_variable()
+                if variable is None:
+                    self._model = [False] + \
+                                  [self._values[variable] for variable in
+                                   range(1, self.variables_count + 1)]
+                    self._backtrack(0)
+                    return True
+                self._trail_limits.append(len(self._trail))
+                decision = variable if self._phases[variable] else -variable
+            self._assign(decision, None)
+
+    def value(self, variable: int) -> bool:
+        """Returns the value of the given variable in the assignment found by
+        the last successful call to `solve`.
+
+        Parameters:
+            variable: variable of the solver.
+
+        Returns:
+            The value of the given variable in the found assignment.
+        """
+        assert self._model is not None
+        return self._model[variable]
+
+    def core(self) -> List[int]:
+        """Returns the assumptions that the clauses of the solver contradict,
+        as found by the last unsuccessful call to `solve`.
+
+        Returns:
+            A list of assumptions of the last call to `solve`, such that the
+            clauses of the solver are unsatisfiable together with these
+            assumptions. The list is empty if the clauses are unsatisfiable
+            by themselves.
+        """
+        assert self._core is not None
+        return list(self._core)
+
+    def _analyze_assumption(self, assumption: int) -> List[int]:
+        """Finds the assumptions that imply the negation of the given
+        assumption.
+
+        Parameters:
+            assumption: an assumption whose negation holds, while all decisions
+                made so far are assumptions.
+
+        Returns:
+            The given assumption, followed by the earlier assumptions from
+            which the negation of the given assumption was propagated.
+        """
+        core = [assumption]
+        seen = {abs(assumption)}
+        for literal in reversed(self._trail):
+            variable = abs(literal)
+            if variable not in seen or self._levels[variable] == 0:
+                continue
+            reason = self._reasons[variable]
+            if reason is None:
+                core.append(literal)
+            else:
+                for other in self._clauses[reason]:
+                    if self._levels[abs(other)] > 0:
+                        seen.add(abs(other))
+        return core
+
+    def _assign(self, literal: int, reason: Optional[int]) -> None:
+        """Makes the given literal hold at the current decision level.
+
+        Parameters:
+            literal: the literal to make hold.
+            reason: the index of the clause that implied the literal, or
+                ``None`` for decisions and for literals implied at level 0.
+        """
+        variable = abs(literal)
+        self._values[literal] = True
+        self._values[-literal] = False
+        self._levels[variable] = len(self._trail_limits)
+        self._reasons[variable] = reason
+        self._trail.append(literal)
+
+    def _backtrack(self, level: int) -> None:
+        """Undoes all assignments made above the given decision level.
+
+        Parameters:
+            level: the decision level to return to.
+        """
+        if len(self._trail_limits) <= level:
+            return
+        limit = self._trail_limits[level]
+        for literal in self._trail[limit:]:
+            variable = abs(literal)
+            self._phases[variable] = literal > 0
+            del self._values[literal]
+            del self._values[-literal]
+            self._reasons[variable] = None
+            heappush(self._queue, (-self._activities[variable], variable))
+        del self._trail[limit:]
+        del self._trail_limits[level:]
+        self._propagated = min(self._propagated, limit)
+
+    def _propagate(self) -> Optional[int]:
+        """Performs unit propagation from all assignments not yet propagated.
+
+        Returns:
+            The index of a clause all of whose literals are false, or ``None``
+            if no such clause was encountered.
+        """
+        values = self._values
+        clauses = self._clauses
+        watches = self._watches
+        while self._propagated < len(self._trail):
+            false_literal = -self._trail[self._propagated]
+            self._propagated += 1
+            watchers = watches[false_literal]
+            kept = []
+            for position, index in enumerate(watchers):
+                clause = clauses[index]
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], false_literal
+                other = clause[0]
+                if values.get(other) is True:
+                    kept.append(index)
+                    continue
+                for i in range(2, len(clause)):
+                    if values.get(clause[i]) is not False:
+                        clause[1], clause[i] = clause[i], false_literal
+                        watches[clause[1]].append(index)
+                        break
+                else:
+                    kept.append(index)
+                    if values.get(other) is False:
+                        kept.extend(watchers[position + 1:])
+                        watches[false_literal] = kept
+                        return index
+                    self._assign(other, index)
+            watches[false_literal] = kept
+        return None
+
+    def _analyze(self, conflict: int) -> Tuple[List[int], int]:
+        """Derives a learned clause from the given conflicting clause, by
+        resolving it with the reasons of the literals assigned at the current
+        decision level until a single such literal (the first unique
+        implication point) remains.
+
+        Parameters:
+            conflict: the index of a clause all of whose literals are false.
+
+        Returns:
+            A pair of the learned clause, whose first literal is the negation
+            of the first unique implication point and whose second literal (if
+            any) is of the highest remaining decision level, and the decision
+            level to backtrack to.
+        """
+        level = len(self._trail_limits)
+        seen = set()
+        learned = [0]
+        pending = 0
+        clause = self._clauses[conflict]
+        position = len(self._trail) - 1
+        while True:
+            for literal in clause:
+                variable = abs(literal)
+                if variable not in seen and self._levels[variable] > 0:
+                    seen.add(variable)
+                    self._bump(variable)
+                    if self._levels[variable] == level:
+                        pending += 1
+                    else:
+                        learned.append(literal)
+            while abs(self._trail[position]) not in seen:
+                position -= 1
+            literal = self._trail[position]
+            position -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self._clauses[self._reasons[abs(literal)]]
+        learned[0] = -literal
+        if len(learned) == 1:
+            return learned, 0
+        highest = max(range(1, len(learned)),
+                      key=lambda i: self._levels[abs(learned[i])])
+        learned[1], learned[highest] = learned[highest], learned[1]
+        return learned, self._levels[abs(learned[1])]
+
+    def _bump(self, variable: int) -> None:
+        """Increases the activity of the given variable, which took part in a
+        conflict.
+
+        Parameters:
+            variable: the variable whose activity to increase.
+        """
+        self._activities[variable] += self._activity_increment
+        if self._activities[variable] > 1e100:
+            self._activities = [activity * 1e-100
+                                for activity in self._activities]
+            self._activity_increment *= 1e-100
+        if variable not in self._values:
+            heappush(self._queue, (-self._activities[variable], variable))
+
+    def _pick_variable(self) -> Optional[int]:
+        """Finds the most active unassigned variable.
+
+        Returns:
+            The most active unassigned variable, or ``None`` if all variables
+            are assigned.
+        """
+        if len(self._queue) > 2 * self.variables_count + 100:
+            # Drop the stale entries of assigned or since-bumped variables.
+            self._queue = [(-self._activities[variable], variable)
+                           for variable in range(1, self.variables_count + 1)
+                           if variable not in self._values]
+            heapify(self._queue)
+        while len(self._queue) > 0:
+            variable = heappop(self._queue)[1]
+            if variable not in self._values:
+                return variable
+        return None
+
+
+def _luby(i: int) -> int:
+    """Computes the given element of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1,
+    1, 2, 1, 1, 2, 4, 8, ...
+
+    Parameters:
+        i: zero-based index of the element to compute.
+
+    Returns:
+        The computed element.
+    """
+    size, power = 1, 1
+    while size < i + 1:
+        size = 2 * size + 1
+        power *= 2
+    while size - 1 != i:
+        size = (size - 1) // 2
+        power //= 2
+        i %= size
+    return power
+
+
+def find_model(formulae: Iterable[Formula]) -> Optional[Dict[str, bool]]:
+    """Searches for a model in which all of the given formulae hold.
+
+    Parameters:
+        formulae: formulae to find a model for.
+
+    Returns:
+        A model over exactly the variables of the given formulae in which all
+        of these formulae hold, or ``None`` if no such model exists.
+    """
+    cnf = CNF()
+    for formula in formulae:
+        cnf.add_formula(formula)
+    solver = Solver()
+    for _ in range(cnf.variables_count):
+        solver.new_variable()
+    for clause in cnf.clauses:
+        if not solver.add_clause(clause):
+            return None
+    if not solver.solve():
+        return None
+    return {name: solver.value(variable)
+            for name, variable in sorted(cnf.variables.items())}
+
+
+class Session:
+    """An incremental satisfiability session, to which formulae can be added
+    and from which they can be retracted, keeping everything learned by the
+    solver in between.
+
+    Each formula is encoded once into a `~propositions.cnf.CNF` whose clauses
+    only define a literal for every subformula, and the formulae of the session
+    are required to hold by assuming their literals in each search, which is
+    what allows retracting them and finding which of them are contradictory.
+
+    Attributes:
+        formulae (`~typing.List`\\[`~propositions.syntax.Formula`]): the
+            formulae of the session, in the order of their addition.
+    """
+    formulae: List[Formula]
+
+    def __init__(self) -> None:
+        """Initializes a `Session` with no formulae."""
+        self.formulae = []
+        self._cnf = CNF()
+        self._solver = Solver()
+        self._added_clauses = 0
+        self._core = None
+
+    def _literal(self, formula: Formula) -> int:
+        """Encodes the given formula into the solver of the current session,
+        if not already encoded.
+
+        Parameters:
+            formula: formula to encode.
+
+        Returns:
+            A literal of the solver that holds if and only if the given formula
+            holds.
+        """
+        literal = self._cnf.encode(formula)
+        while self._solver.variables_count < self._cnf.variables_count:
+            self._solver.new_variable()
+        for clause in self._cnf.clauses[self._added_clauses:]:
+            self._solver.add_clause(clause)
+        self._added_clauses = len(self._cnf.clauses)
+        return literal
+
+    def add(self, formula: Formula) -> None:
+        """Adds the given formula to the current session.
+
+        Parameters:
+            formula: formula to add.
+        """
+        self._literal(formula)
+        self.formulae.append(formula)
+
+    def retract(self, formula: Formula) -> None:
+        """Retracts the given formula from the current session.
+
+        Parameters:
+            formula: formula of the current session to retract.
+        """
+        self.formulae.remove(formula)
+
+    def solve(self, assumptions: Iterable[Formula] = ()) -> \
+            Optional[Dict[str, bool]]:
+        """Searches for a model in which all of the formulae of the current
+        session, and all of the given formulae, hold.
+
+        Parameters:
+            assumptions: formulae to require to hold only in the current
+                search.
+
+        Returns:
+            A model over exactly the variables of the formulae of the current
+            session and of the given formulae in which all of these formulae
+            hold, or ``None`` if no such model exists, in which case the
+            formulae that contradict each other are available through `core`.
+        """
+        formulae = self.formulae + list(assumptions)
+        literals = [self._literal(formula) for formula in formulae]
+        self._core = None
+        if not self._solver.solve(literals):
+            core = set(self._solver.core())
+            self._core = [formula for formula, literal
+                          in zip(formulae, literals) if literal in core]
+            return None
+        variables = set()
+        for formula in formulae:
+            variables.update(formula.variables())
+        return {variable: self._solver.value(self._cnf.variables[variable])
+                for variable in sorted(variables)}
+
+    def core(self) -> List[Formula]:
+        """Returns formulae that contradict each other, as found by the last
+        unsuccessful call to `solve`.
+
+        Returns:
+            A list of formulae of the current session and of the assumptions of
+            the last call to `solve`, in which all of these formulae hold
+            in no model.
+        """
+        assert self._core is not None
+        return list(self._core)
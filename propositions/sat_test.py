@@ -0,0 +1,128 @@
+# (c) This file is part of the course
+# Mathematical Logic through Programming
+# by Gonczarowski and Nisan.
+# File name: propositions/sat_test.py
+
+"""Tests for the propositions.sat module."""
+
+from propositions.syntax import *
+from propositions.semantics import *
+from propositions.sat import *
+
+from propositions.semantics_test import many_fs, check_backend
+
+def pigeonhole_formulae(pigeons, holes):
+    formulae = []
+    for i in range(pigeons):
+        formula = Formula('p' + str(i * holes))
+        for j in range(1, holes):
+            formula = Formula('|', formula, Formula('p' + str(i * holes + j)))
+        formulae.append(formula)
+    for j in range(holes):
+        for i in range(pigeons):
+            for k in range(i + 1, pigeons):
+                formulae.append(Formula('~', Formula(
+                    '&', Formula('p' + str(i * holes + j)),
+                    Formula('p' + str(k * holes + j)))))
+    return formulae
+
+def test_solver(debug=False):
+    if debug:
+        print('Testing the solver on clauses')
+    solver = Solver()
+    x, y, z = solver.new_variable(), solver.new_variable(), \
+              solver.new_variable()
+    assert solver.add_clause([x, y])
+    assert solver.add_clause([-x, z])
+    assert solver.add_clause([-y, z])
+    assert solver.solve()
+    assert solver.value(z) and (solver.value(x) or solver.value(y))
+    assert solver.add_clause([-z, -x])
+    assert solver.solve()
+    assert solver.value(z) and not solver.value(x) and solver.value(y)
+    assert not solver.add_clause([-z])
+    assert not solver.solve()
+
+def test_solver_assumptions(debug=False):
+    if debug:
+        print('Testing the solver under assumptions')
+    solver = Solver()
+    x, y, z, w = [solver.new_variable() for _ in range(4)]
+    assert solver.add_clause([-x, y])
+    assert solver.add_clause([-y, z])
+    assert solver.solve([x, w])
+    assert solver.value(x) and solver.value(z) and solver.value(w)
+    assert not solver.solve([w, x, -z])
+    assert set(solver.core()) == {x, -z}
+    assert not solver.unsatisfiable
+    assert solver.solve([-z])
+    assert not solver.value(x)
+    assert solver.add_clause([-w])
+    assert not solver.solve([w])
+    assert solver.core() == [w]
+    assert solver.solve()
+
+def test_find_model(debug=False):
+    for infix in many_fs:
+        formula = Formula.parse(infix)
+        if debug:
+            print('Testing finding a model for', formula)
+        model = find_model([formula])
+        assert (model is not None) == is_satisfiable(formula)
+        if model is not None:
+            assert set(model.keys()) == formula.variables()
+            assert evaluate(formula, model)
+    formulae = [Formula.parse('(p->q)'), Formula.parse('(q->r)'),
+                Formula.parse('p')]
+    model = find_model(formulae)
+    assert model == {'p': True, 'q': True, 'r': True}
+    assert find_model(formulae + [Formula.parse('~r')]) is None
+
+def test_pigeonhole(debug=False):
+    if debug:
+        print('Testing that 7 pigeons do not fit in 6 holes')
+    assert find_model(pigeonhole_formulae(7, 6)) is None
+    formulae = pigeonhole_formulae(6, 6)
+    model = find_model(formulae)
+    assert model is not None
+    for formula in formulae:
+        assert evaluate(formula, model)
+
+def test_sat_backend(debug=False):
+    check_backend('sat', debug)
+
+def test_session(debug=False):
+    if debug:
+        print('Testing incremental sessions')
+    session = Session()
+    for infix in ['(p->q)', '(q->r)', '(s|t)']:
+        session.add(Formula.parse(infix))
+    model = session.solve([Formula.parse('p')])
+    assert set(model.keys()) == {'p', 'q', 'r', 's', 't'}
+    assert model['p'] and model['q'] and model['r'] and (model['s'] or
+                                                         model['t'])
+    assert session.solve([Formula.parse('p'), Formula.parse('~r')]) is None
+    assert set(session.core()) == {Formula.parse('(p->q)'),
+                                   Formula.parse('(q->r)'), Formula.parse('p'),
+                                   Formula.parse('~r')}
+    session.retract(Formula.parse('(q->r)'))
+    model = session.solve([Formula.parse('p'), Formula.parse('~r')])
+    assert set(model.keys()) == {'p', 'q', 'r', 's', 't'}
+    assert model['p'] and model['q'] and not model['r']
+    formulae = pigeonhole_formulae(5, 4)
+    for formula in formulae:
+        session.add(formula)
+    assert session.solve() is None
+    assert set(session.core()).issubset(formulae)
+    assert find_model(session.core()) is None
+    for formula in formulae:
+        session.retract(formula)
+    assert session.solve() is not None
+
+def test_all(debug=False):
+    test_solver(debug)
+    test_solver_assumptions(debug)
+    test_find_model(debug)
+    test_pigeonhole(debug)
+    test_sat_backend(debug)
+    test_session(debug)
@@ -5,10 +5,19 @@
 
 """Semantic analysis of propositional-logic constructs."""
 
-from typing import AbstractSet, Iterable, Iterator, List, Mapping
-from itertools import product
+from typing import AbstractSet, Callable, Dict, Iterable, Iterator, List, \
+                   Mapping, Optional, TextIO, Tuple, Union
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice, product
+import multiprocessing.synchronize
+from os import cpu_count
+import sys
+from weakref import WeakKeyDictionary
 from propositions.syntax import *
 from propositions.proofs import *
+from propositions.sat import find_model
+from propositions.bdd import BDD, formula_bdd
 
 
 Model = Mapping[str, bool]
@@ -55,64 +64,115 @@ def evaluate(formula: Formula, model: Model) -> bool:
         The truth value of the given formula in the given model.
     """
     assert is_model(model)
-    assert formula.variables().issubset(variables(model))
     # Task 2.1
+    compiled = _compiled_formulae.get(formula)
+    if compiled is None:
+        evaluations = _evaluation_counts.get(formula, 0) + 1
+        if evaluations < COMPILE_THRESHOLD:
+            _evaluation_counts[formula] = evaluations
+        else:
+            _evaluation_counts.pop(formula, None)
+            compiled = compile_formula(formula)
+    if compiled is not None:
+        assert set(compiled.variables).issubset(variables(model))
+        return compiled(*[model[variable] for variable in compiled.variables])
 
-    def evaluate_constant(formula: Formula) -> bool:
-        if formula.root == 'T':
-            return True
-        return False
-
-    def evaluate_variable(formula: Formula) -> bool:
-        return model[formula.root]
-
-    def evaluate_unary(formula: Formula) -> bool:
-        return not evaluate(formula.first, model)
+    assert formula.variables().issubset(variables(model))
 
-    def evaluate_binary(formula: Formula) -> bool:
-        if formula.root == '&':
-            return evaluate(formula.first, model) and evaluate(formula.second, model)
+    def evaluate_node(formula: Formula, first: Optional[bool],
+                      second: Optional[bool]) -> bool:
+        if is_constant(formula.root):
+            return formula.root == 'T'
+        elif is_variable(formula.root):
+            return model[formula.root]
+        elif is_unary(formula.root):
+            return not first
+        elif formula.root == '&':
+            return first and second
         elif formula.root == '|':
-            return evaluate(formula.first, model) or evaluate(formula.second, model)
+            return first or second
         elif formula.root == '->':
-            first = evaluate(formula.first, model)
-            second = evaluate(formula.second, model)
-            if first and not second:
-                return False
-            return True
+            return not first or second
         elif formula.root == '+':
-            first = evaluate(formula.first, model)
-            second = evaluate(formula.second, model)
-            if (first and not second) or (not first and second):
-                return True
-            return False
+            return first != second
         elif formula.root == '<->':
-            first = evaluate(formula.first, model)
-            second = evaluate(formula.second, model)
-            if (first and second) or (not first and not second):
-                return True
-            return False
+            return first == second
         elif formula.root == '-&':
-            first = evaluate(formula.first, model)
-            second = evaluate(formula.second, model)
-            if first and second:
-                return False
-            return True
+            return not (first and second)
         elif formula.root == '-|':
-            first = evaluate(formula.first, model)
-            second = evaluate(formula.second, model)
-            if (not first) and (not second):
-                return True
-            return False
+            return not (first or second)
+
+    return formula.fold(evaluate_node)
+
 
-    if is_constant(formula.root):
-        return evaluate_constant(formula)
-    elif is_variable(formula.root):
-        return evaluate_variable(formula)
-    elif is_unary(formula.root):
-        return evaluate_unary(formula)
-    elif is_binary(formula.root):
-        return evaluate_binary(formula)
+#: The number of times `evaluate` evaluates a formula by traversing it before
+#: compiling it with `compile_formula`.
+COMPILE_THRESHOLD = 8
+
+#: The functions compiled by `compile_formula`, keyed by their formulae.
+_compiled_formulae = WeakKeyDictionary()
+#: The number of times `evaluate` has traversed each not-yet-compiled formula.
+_evaluation_counts = WeakKeyDictionary()
+
+#: Python expression templates for the binary operators, for `compile_formula`.
+_COMPILED_BINARY_OPERATORS = {'&': '{} and {}', '|': '{} or {}',
+                              '->': 'not {} or {}', '+': '{} != {}',
+                              '<->': '{} == {}', '-&': 'not ({} and {})',
+                              '-|': 'not ({} or {})'}
+
+
+def compile_formula(formula: Formula) -> Callable[..., bool]:
+    """Compiles the given formula into a Python function that calculates its
+    truth value. The compiled function is cached, so compiling the same formula
+    again returns the same function.
+
+    Parameters:
+        formula: formula to compile.
+
+    Returns:
+        A function that takes the truth values of the variables of the given
+        formula as positional arguments, in alphabetical order of the
+        variables, and returns the truth value of the formula. The variables
+        of the formula, in this order, are available as the ``variables``
+        attribute of the function.
+
+    Examples:
+        >>> compiled = compile_formula(Formula.parse('(q->~p)'))
+        >>> compiled.variables
+        ('p', 'q')
+        >>> compiled(True, True)
+        False
+    """
+    compiled = _compiled_formulae.get(formula)
+    if compiled is not None:
+        return compiled
+    variables_list = sorted(formula.variables())
+    lines = ['def compiled(' + ', '.join(variables_list) + '):']
+
+    # Every compound subformula is computed once, into its own local variable,
+    # so the generated code is flat regardless of the depth of the formula.
+    def compile_node(formula: Formula, first: Optional[str],
+                     second: Optional[str]) -> str:
+        if is_constant(formula.root):
+            return 'True' if formula.root == 'T' else 'False'
+        elif is_variable(formula.root):
+            return formula.root
+        elif is_unary(formula.root):
+            expression = 'not ' + first
+        else:
+            expression = _COMPILED_BINARY_OPERATORS[formula.root].format(
+                first, second)
+        name = '_' + str(len(lines))
+        lines.append('    ' + name + ' = ' + expression)
+        return name
+
+    lines.append('    return ' + formula.fold(compile_node))
+    namespace = {}
+    exec('\n'.join(lines), namespace)
+    compiled = namespace['compiled']
+    compiled.variables = tuple(variables_list)
+    _compiled_formulae[formula] = compiled
+    return compiled
 
 
 def all_models(variables: List[str]) -> Iterable[Model]:
@@ -134,42 +194,498 @@ def all_models(variables: List[str]) -> Iterable[Model]:
         assert is_variable(v)
     # Task 2.2
 
-    product_result = product([False, True], repeat=len(variables))
-    models = []
-    for model in product_result:
-        temp_model = iter(model)
-        result_temp = {}
-        for v in variables:
-            result_temp[v] = next(temp_model)
-        models.append(result_temp)
-    return models
+    # The models are generated lazily, so that callers that stop at the first
+    # model of interest never construct the others.
+    return (dict(zip(variables, values))
+            for values in product((False, True), repeat=len(variables)))
+
+
+def evaluate_bitwise(formula: Formula, masks: Mapping[str, int],
+                     size: int) -> int:
+    """Calculates the truth values of the given formula in many models at
+    once, by representing the values of each variable in all of these models
+    as the bits of a single integer, and each operator as a single bitwise
+    operation on such integers.
+
+    Parameters:
+        formula: formula to calculate the truth values of.
+        masks: mapping from each variable of the formula (and possibly
+            more variables) to an integer whose `i`-th bit is the value of this
+            variable in the `i`-th model.
+        size: the number of models.
+
+    Returns:
+        An integer whose `i`-th bit is the truth value of the given formula in
+        the `i`-th model.
+    """
+    assert formula.variables().issubset(masks.keys())
+    full = (1 << size) - 1
+
+    def evaluate_node(formula: Formula, first: Optional[int],
+                      second: Optional[int]) -> int:
+        if is_constant(formula.root):
+            return full if formula.root == 'T' else 0
+        elif is_variable(formula.root):
+            return masks[formula.root]
+        elif is_unary(formula.root):
+            return full ^ first
+        elif formula.root == '&':
+            return first & second
+        elif formula.root == '|':
+            return first | second
+        elif formula.root == '->':
+            return (full ^ first) | second
+        elif formula.root == '+':
+            return first ^ second
+        elif formula.root == '<->':
+            return full ^ first ^ second
+        elif formula.root == '-&':
+            return full ^ (first & second)
+        elif formula.root == '-|':
+            return full ^ (first | second)
+
+    return formula.fold(evaluate_node)
+
 
+def _all_models_masks(variables: List[str]) -> Dict[str, int]:
+    """Computes, for each of the given variables, the integer whose `i`-th bit
+    is the value of the variable in the `i`-th model returned by
+    `all_models`\ ``(``\ `variables`\ ``)``.
+
+    Parameters:
+        variables: list of variables over which the models are taken.
+
+    Returns:
+        A mapping from each of the given variables to its integer.
+    """
+    size = 1 << len(variables)
+    masks = {}
+    for j, variable in enumerate(variables):
+        # The variable alternates between runs of `run` False values and `run`
+        # True values; one period of this pattern is doubled until it covers
+        # all models.
+        run = size >> (j + 1)
+        mask = ((1 << run) - 1) << run
+        width = 2 * run
+        while width < size:
+            mask |= mask << width
+            width *= 2
+        masks[variable] = mask
+    return masks
+
+
+#: The backends that semantic checks such as `is_tautology` can use.
+BACKENDS = ('truth_table', 'parallel', 'sat', 'bdd')
+
+#: The number of trailing variables whose values vary within a single block of
+#: models evaluated bitwise at once by `all_models_blocks`.
+BLOCK_VARIABLES = 16
+
+
+def all_models_blocks(variables: List[str]) -> \
+        Iterator[Tuple[Dict[str, int], int]]:
+    """Lazily splits all possible models over the given variables into
+    consecutive blocks of models that agree on a prefix of the variables, and
+    encodes each block for `evaluate_bitwise`.
+
+    Parameters:
+        variables: list of variables over which to calculate the models.
+
+    Returns:
+        An iterator over pairs of the variable masks and the number of models
+        of each block, in the order of the models returned by
+        `all_models`\ ``(``\ `variables`\ ``)``.
+    """
+    prefix_length = max(len(variables) - BLOCK_VARIABLES, 0)
+    prefix, suffix = variables[:prefix_length], variables[prefix_length:]
+    size = 1 << len(suffix)
+    full = (1 << size) - 1
+    suffix_masks = _all_models_masks(suffix)
+    for prefix_values in product((False, True), repeat=prefix_length):
+        masks = dict(suffix_masks)
+        for variable, value in zip(prefix, prefix_values):
+            masks[variable] = full if value else 0
+        yield masks, size
 
-def truth_values(formula: Formula, models: Iterable[Model]) -> Iterable[bool]:
+
+#: The number of worker processes of the ``'parallel'`` backend, or ``None``
+#: for the number of processors.
+PARALLEL_WORKERS = None
+
+#: The number of tasks that the ``'parallel'`` backend splits the blocks of
+#: `all_models_blocks` into, per worker process.
+PARALLEL_TASKS_PER_WORKER = 4
+
+#: In a worker process of the ``'parallel'`` backend, the event that is set
+#: once any worker has found a counterexample.
+_cancelled = None
+
+
+def _set_cancelled(cancelled: multiprocessing.synchronize.Event) -> None:
+    """Initializes a worker process of the ``'parallel'`` backend.
+
+    Parameters:
+        cancelled: event to set once any worker has found a counterexample.
+    """
+    global _cancelled
+    _cancelled = cancelled
+
+
+def _has_counterexample(assumptions: Tuple[Formula, ...], conclusion: Formula,
+                        variables: List[str], prefix_length: int, start: int,
+                        stop: int) -> bool:
+    """Checks if some model of the given blocks of models satisfies all of the
+    given assumptions but not the given conclusion.
+
+    Parameters:
+        assumptions: assumptions to check.
+        conclusion: conclusion to check.
+        variables: list of variables that contains all variables of the
+            assumptions and of the conclusion.
+        prefix_length: the number of leading variables whose values are fixed
+            within each block, such that the `i`-th block consists of the
+            consecutive models returned by `all_models`\ ``(``\ `variables`\
+            ``)`` whose prefix values are the binary digits of `i`.
+        start: the first block to check.
+        stop: the block after the last block to check.
+
+    Returns:
+        ``True`` if such a model was found, ``False`` if there is no such model,
+        or if another worker process has already found one.
+    """
+    prefix, suffix = variables[:prefix_length], variables[prefix_length:]
+    size = 1 << len(suffix)
+    full = (1 << size) - 1
+    suffix_masks = _all_models_masks(suffix)
+    for index in range(start, stop):
+        if _cancelled is not None and _cancelled.is_set():
+            return False
+        masks = dict(suffix_masks)
+        for j, variable in enumerate(prefix):
+            masks[variable] = full if index >> (prefix_length - 1 - j) & 1 \
+                              else 0
+        # The models of the block in which all assumptions hold.
+        holding = full
+        for assumption in assumptions:
+            holding &= evaluate_bitwise(assumption, masks, size)
+            if holding == 0:
+                break
+        if holding != 0 and \
+                holding & ~evaluate_bitwise(conclusion, masks, size) != 0:
+            return True
+    return False
+
+
+def _sweep(assumptions: Tuple[Formula, ...], conclusion: Formula,
+           variables: List[str], parallel: bool) -> bool:
+    """Checks if all models over the given variables that satisfy all of the
+    given assumptions also satisfy the given conclusion.
+
+    Parameters:
+        assumptions: assumptions to check.
+        conclusion: conclusion to check.
+        variables: list of variables that contains all variables of the
+            assumptions and of the conclusion.
+        parallel: whether to split the models between worker processes, in
+            which case all workers stop as soon as one of them finds a
+            counterexample.
+
+    Returns:
+        ``True`` if the conclusion holds in all models that satisfy all of the
+        assumptions, ``False`` otherwise.
+    """
+    prefix_length = max(len(variables) - BLOCK_VARIABLES, 0)
+    blocks = 1 << prefix_length
+    workers = PARALLEL_WORKERS or cpu_count() or 1
+    if not parallel or blocks == 1:
+        return not _has_counterexample(assumptions, conclusion, variables,
+                                       prefix_length, 0, blocks)
+    tasks = min(blocks, workers * PARALLEL_TASKS_PER_WORKER)
+    bounds = [blocks * task // tasks for task in range(tasks + 1)]
+    cancelled = multiprocessing.Event()
+    with ProcessPoolExecutor(workers, initializer=_set_cancelled,
+                             initargs=(cancelled,)) as executor:
+        futures = [executor.submit(_has_counterexample, assumptions,
+                                   conclusion, variables, prefix_length,
+                                   bounds[task], bounds[task + 1])
+                   for task in range(tasks)]
+        for future in as_completed(futures):
+            if future.result():
+                cancelled.set()
+                for other in futures:
+                    other.cancel()
+                return False
+    return True
+
+
+def truth_table(formula: Formula, variables: List[str]) -> int:
+    """Calculates the truth table of the given formula over the given
+    variables.
+
+    Parameters:
+        formula: formula to calculate the truth table of.
+        variables: list of variables that contains all variables of the
+            formula.
+
+    Returns:
+        An integer whose `i`-th bit is the truth value of the given formula in
+        the `i`-th model returned by `all_models`\ ``(``\ `variables`\ ``)``.
+    """
+    return evaluate_bitwise(formula, _all_models_masks(variables),
+                            1 << len(variables))
+
+
+def _canonical_form(formula: Formula) -> Tuple[Formula, Tuple[str, ...]]:
+    """Renames the variables of the given formula canonically, so that formulae
+    that differ only in the names of their variables are renamed into the same
+    formula.
+
+    Parameters:
+        formula: formula to rename the variables of.
+
+    Returns:
+        A pair of the given formula with its variables renamed to ``'p1'``,
+        ``'p2'``, etc. in the order of their first occurrence in the formula,
+        and of the variables of the given formula in this order.
+    """
+    variables_list = []
+    renaming = {}
+    for subformula in formula.subformulae():
+        if is_variable(subformula.root) and subformula.root not in renaming:
+            variables_list.append(subformula.root)
+            renaming[subformula.root] = Formula('p' + str(len(variables_list)))
+    return formula.substitute_variables(renaming), tuple(variables_list)
+
+
+class TruthTableCache:
+    """A bounded cache of truth tables and of tautology and contradiction
+    verdicts, keyed by the formulae with their variables renamed canonically,
+    so that formulae that differ only in the names of their variables share
+    their entries. Once the cache is full, the least recently used entry is
+    evicted for each new one.
+
+    Attributes:
+        maxsize (`int`): the maximal number of entries of the cache.
+        hits (`int`): the number of lookups that were answered by the cache.
+        misses (`int`): the number of lookups that had to be computed.
+    """
+    maxsize: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        """Initializes an empty `TruthTableCache`.
+
+        Parameters:
+            maxsize: the maximal number of entries of the cache.
+        """
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        """Computes the number of entries of the current cache.
+
+        Returns:
+            The number of entries of the current cache.
+        """
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Removes all entries of the current cache, and resets its counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: Tuple[str, Formula]) -> Optional[Union[bool, int]]:
+        """Looks up the given key in the current cache, marking it as the most
+        recently used entry.
+
+        Parameters:
+            key: key to look up.
+
+        Returns:
+            The cached value of the given key, or ``None`` if it is not cached.
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key: Tuple[str, Formula], value: Union[bool, int]) -> None:
+        """Caches the given value of the given key, evicting the least recently
+        used entry if the current cache is full.
+
+        Parameters:
+            key: key to cache the value of.
+            value: value to cache.
+        """
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def truth_table(self, formula: Formula) -> Tuple[Tuple[str, ...], int]:
+        """Calculates the truth table of the given formula, or looks it up.
+
+        Parameters:
+            formula: formula to calculate the truth table of.
+
+        Returns:
+            A pair of the variables of the given formula in the order of their
+            first occurrence in it, and of the truth table of the given formula
+            over these variables, as returned by `truth_table`.
+        """
+        canonical, variables_list = _canonical_form(formula)
+        key = ('truth_table', canonical)
+        table = self._get(key)
+        if table is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            table = truth_table(canonical, ['p' + str(i + 1) for i in
+                                            range(len(variables_list))])
+            self._put(key, table)
+        return variables_list, table
+
+    def is_tautology(self, formula: Formula) -> bool:
+        """Checks if the given formula is a tautology, or looks it up.
+
+        Parameters:
+            formula: formula to check.
+
+        Returns:
+            ``True`` if the given formula is a tautology, ``False`` otherwise.
+        """
+        return self._verdict(formula, True)
+
+    def is_contradiction(self, formula: Formula) -> bool:
+        """Checks if the given formula is a contradiction, or looks it up.
+
+        Parameters:
+            formula: formula to check.
+
+        Returns:
+            ``True`` if the given formula is a contradiction, ``False``
+            otherwise.
+        """
+        return self._verdict(formula, False)
+
+    def _verdict(self, formula: Formula, value: bool) -> bool:
+        """Checks if the given formula has the given truth value in all models,
+        or looks it up, possibly from the truth table of the formula.
+
+        Parameters:
+            formula: formula to check.
+            value: truth value to check.
+
+        Returns:
+            ``True`` if the given formula has the given truth value in all
+            models, ``False`` otherwise.
+        """
+        canonical, variables_list = _canonical_form(formula)
+        key = ('tautology' if value else 'contradiction', canonical)
+        verdict = self._get(key)
+        if verdict is None:
+            table = self._get(('truth_table', canonical))
+            if table is not None:
+                verdict = table == ((1 << (1 << len(variables_list))) - 1
+                                    if value else 0)
+        if verdict is not None:
+            self.hits += 1
+            return verdict
+        self.misses += 1
+        verdict = _sweep((), canonical if value else Formula('~', canonical),
+                         ['p' + str(i + 1) for i in range(len(variables_list))],
+                         False)
+        self._put(key, verdict)
+        return verdict
+
+
+#: The cache of the truth tables and verdicts computed by the
+#: ``'truth_table'`` backend of `is_tautology` and `is_contradiction`.
+truth_table_cache = TruthTableCache()
+
+
+def truth_values(formula: Formula, models: Iterable[Model],
+                 parallel: bool = False) -> Iterable[bool]:
     """Calculates the truth value of the given formula in each of the given
     model.
 
     Parameters:
         formula: formula to calculate the truth value of.
         models: iterable over models to calculate the truth value in.
+        parallel: whether to split the models between worker processes.
 
     Returns:
         An iterable over the respective truth values of the given formula in
         each of the given models, in the order of the given models.
     """
     # Task 2.3
-    truth_vals = []
-    for model in models:
-        truth_vals.append(evaluate(formula, model))
-    return truth_vals
+    # The models are consumed, and the values produced, lazily in chunks, each
+    # of which is evaluated bitwise at once.
+    models = iter(models)
+    chunks = iter(lambda: list(islice(models, 1 << BLOCK_VARIABLES)), [])
+    if not parallel:
+        for chunk in chunks:
+            yield from _chunk_truth_values(formula, chunk)
+        return
+    workers = PARALLEL_WORKERS or cpu_count() or 1
+    executor = ProcessPoolExecutor(workers)
+    # A bounded window of chunks is evaluated ahead of the consumer.
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(executor.submit(_chunk_truth_values, formula,
+                                           chunk))
+            if len(pending) == 2 * workers:
+                yield from pending.popleft().result()
+        while len(pending) > 0:
+            yield from pending.popleft().result()
+    finally:
+        # The chunks still waiting in the window are not needed if the
+        # consumer stopped early.
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def _chunk_truth_values(formula: Formula, chunk: List[Model]) -> List[bool]:
+    """Calculates the truth value of the given formula in each of the given
+    models at once, bitwise.
+
+    Parameters:
+        formula: formula to calculate the truth value of.
+        chunk: models to calculate the truth value in.
+
+    Returns:
+        The respective truth values of the given formula in each of the given
+        models.
+    """
+    masks = {}
+    for variable in formula.variables():
+        bits = ['1' if model[variable] else '0' for model in reversed(chunk)]
+        masks[variable] = int(''.join(bits), 2)
+    values = format(evaluate_bitwise(formula, masks, len(chunk)), 'b')
+    return [bit == '1' for bit in reversed(values.zfill(len(chunk)))]
+
 
+#: The output styles of `print_truth_table`.
+TRUTH_TABLE_STYLES = ('table', 'csv', 'tsv')
 
-def print_truth_table(formula: Formula) -> None:
+
+def print_truth_table(formula: Formula, file: Optional[TextIO] = None,
+                      style: str = 'table') -> None:
     """Prints the truth table of the given formula, with variable-name columns
     sorted alphabetically.
 
     Parameters:
         formula: formula to print the truth table of.
+        file: file-like object to write the truth table to, or ``None`` to
+            print it to the standard output.
+        style: ``'table'`` for a table with aligned columns, ``'csv'`` for
+            comma-separated columns, or ``'tsv'`` for tab-separated columns.
 
     Examples:
         #>>> print_truth_table(Formula.parse('~(p&q76)'))
@@ -180,113 +696,115 @@ def print_truth_table(formula: Formula) -> None:
         | T | F   | T        |
         | T | T   | F        |
     """
+    assert style in TRUTH_TABLE_STYLES
     # Task 2.4
-    temp_vars = formula.variables()
-    vars = sorted(temp_vars)
-    models = list(all_models(vars))
-
-    # get the width of each column in the table
-    width_of_cols = []
-    for var in vars:
-        width_of_cols.append(len(var) + 2)
-    width_of_cols.append(len(str(formula))+2)
-
-    # translate boolean values to strings
-    models_temp1 = []
-    models_temp2 = []
-    for m in models:
-        models_temp1 += m.values()
-    for val in models_temp1:
-        if val:
-            models_temp2 += 'T'
-        else:
-            models_temp2 += 'F'
-
-    num_of_rows = len(models)
-    num_of_cols = len(vars) + 1
-
-    # print header line
-    header_line = "|"
-    for var in vars:
-        header_line += " " + var + " |"
-    header_line += " " + str(formula) + " |"
-    print(header_line)
-
-    # print separation line
-    separate_line = "|"
-    for width in width_of_cols:
-        separate_line += '-'*width + '|'
-    print(separate_line)
-
-    # print values of truth table
-    for i in range(num_of_rows):
-        line = "| "
-        for j in range(num_of_cols):
-            if j != num_of_cols - 1:
-                line += models_temp2[0]
-                models_temp2.pop(0)
-                line += " " * (width_of_cols[j] - 2) + "| "
-            else:
-                if evaluate(formula, models[i]):
-                    line += 'T'
-                else:
-                    line += 'F'
-                line += " " * (width_of_cols[j] - 2) + "|"
-        print(line)
-
-
-def is_tautology(formula: Formula) -> bool:
+    if file is None:
+        file = sys.stdout
+    variables_list = sorted(formula.variables())
+    columns = variables_list + [str(formula)]
+
+    # The text of each cell of each column, for each truth value.
+    if style == 'table':
+        cells = [{value: ' ' + ('T' if value else 'F').ljust(len(column)) +
+                         ' |'
+                  for value in (False, True)} for column in columns]
+        file.write('|' + ''.join(' ' + column + ' |' for column in columns) +
+                   '\n|' + ''.join('-' * (len(column) + 2) + '|'
+                                   for column in columns) + '\n')
+        start = '|'
+    else:
+        separator = ',' if style == 'csv' else '\t'
+        cells = [{False: 'F' + separator, True: 'T' + separator}
+                 for _ in columns]
+        cells[-1] = {False: 'F', True: 'T'}
+        file.write(separator.join(columns) + '\n')
+        start = ''
+    values_cells = {'0': cells[-1][False] + '\n', '1': cells[-1][True] + '\n'}
+
+    # The rows are written a block of models at a time, where the block is
+    # evaluated bitwise and the cells of its varying suffix of the variables
+    # are shared by all blocks.
+    prefix_length = max(len(variables_list) - BLOCK_VARIABLES, 0)
+    prefix = variables_list[:prefix_length]
+    suffix_rows = [''.join(cells[prefix_length + j][value]
+                           for j, value in enumerate(values))
+                   for values in product((False, True),
+                                         repeat=len(variables_list) -
+                                                prefix_length)]
+    for masks, size in all_models_blocks(variables_list):
+        row_start = start + ''.join(cells[j][masks[variable] != 0]
+                                    for j, variable in enumerate(prefix))
+        values = format(evaluate_bitwise(formula, masks, size), 'b')
+        file.write(''.join(
+            row_start + row + values_cells[value]
+            for row, value in zip(suffix_rows, reversed(values.zfill(size)))))
+
+
+def is_tautology(formula: Formula, backend: str = 'truth_table') -> bool:
     """Checks if the given formula is a tautology.
 
     Parameters:
         formula: formula to check.
+        backend: ``'truth_table'`` to check all models, with the verdict
+            cached in `truth_table_cache`, ``'parallel'`` to check them in
+            worker processes, ``'sat'`` to search for a model with
+            `~propositions.sat.Solver`, or ``'bdd'`` to build a
+            `~propositions.bdd.BDD`.
 
     Returns:
         ``True`` if the given formula is a tautology, ``False`` otherwise.
     """
+    assert backend in BACKENDS
     # Task 2.5a
-    variables_list = formula.variables()
-    models = all_models(list(variables_list))
-    truth_values_list = truth_values(formula, models)
-    if False in truth_values_list:
-        return False
-    return True
+    if backend == 'sat':
+        return find_model([Formula('~', formula)]) is None
+    if backend == 'bdd':
+        return formula_bdd(formula)[1] == BDD.TRUE
+    if backend == 'truth_table':
+        return truth_table_cache.is_tautology(formula)
+    return _sweep((), formula, list(formula.variables()), True)
 
 
-def is_contradiction(formula: Formula) -> bool:
+def is_contradiction(formula: Formula, backend: str = 'truth_table') -> bool:
     """Checks if the given formula is a contradiction.
 
     Parameters:
         formula: formula to check.
+        backend: ``'truth_table'`` to check all models, with the verdict
+            cached in `truth_table_cache`, ``'parallel'`` to check them in
+            worker processes, ``'sat'`` to search for a model with
+            `~propositions.sat.Solver`, or ``'bdd'`` to build a
+            `~propositions.bdd.BDD`.
 
     Returns:
         ``True`` if the given formula is a contradiction, ``False`` otherwise.
     """
+    assert backend in BACKENDS
     # Task 2.5b
-    variables_list = formula.variables()
-    models = all_models(list(variables_list))
-    truth_values_list = truth_values(formula, models)
-    if True in truth_values_list:
-        return False
-    return True
+    if backend == 'sat':
+        return find_model([formula]) is None
+    if backend == 'bdd':
+        return formula_bdd(formula)[1] == BDD.FALSE
+    if backend == 'truth_table':
+        return truth_table_cache.is_contradiction(formula)
+    return _sweep((), Formula('~', formula), list(formula.variables()), True)
 
 
-def is_satisfiable(formula: Formula) -> bool:
+def is_satisfiable(formula: Formula, backend: str = 'truth_table') -> bool:
     """Checks if the given formula is satisfiable.
 
     Parameters:
         formula: formula to check.
+        backend: ``'truth_table'`` to check all models, ``'parallel'`` to
+            check them in worker processes, ``'sat'`` to search for a model
+            with `~propositions.sat.Solver`, or ``'bdd'`` to build a
+            `~propositions.bdd.BDD`.
 
     Returns:
         ``True`` if the given formula is satisfiable, ``False`` otherwise.
     """
     # Task 2.5c
-    variables_list = formula.variables()
-    models = all_models(list(variables_list))
-    truth_values_list = truth_values(formula, models)
-    if True in truth_values_list:
-        return True
-    return False
+    return not is_contradiction(formula, backend)
 
 
 def synthesize_for_model(model: Model) -> Formula:
@@ -302,37 +820,15 @@ def synthesize_for_model(model: Model) -> Formula:
     """
     assert is_model(model)
     # Task 2.6
-    variables_list = list(variables(model))
-
-    # if there is only one variable in the given model
-    if len(variables_list) == 1:
-        if model[variables_list[0]]:
-            return Formula(variables_list[0])
-        return Formula('~', Formula(variables_list[0]))
-
-    # otherwise
-    if model[variables_list[0]]:
-        f1 = Formula(variables_list[0])
-    else:
-        f1 = Formula('~', Formula(variables_list[0]))
-    if model[variables_list[1]]:
-        f2 = Formula(variables_list[1])
-    else:
-        f2 = Formula('~', Formula(variables_list[1]))
-    formula = temp_formula = Formula('&', f1, f2)
-
-    # if there ara more than two variables in the given model
-    for i in range(2, len(variables_list)):
-        if model[variables_list[i]]:
-            formula = Formula('&', temp_formula, Formula(variables_list[i]))
-        else:
-            formula = Formula('&', temp_formula, Formula('~', Formula(variables_list[i])))
-        temp_formula = formula
-
-    return formula
+    literals = []
+    for variable in variables(model):
+        literal = Formula(variable)
+        literals.append(literal if model[variable] else Formula('~', literal))
+    return balanced('&', literals)
 
 
-def synthesize(variables: List[str], values: Iterable[bool]) -> Formula:
+def synthesize(variables: List[str], values: Iterable[bool],
+               minimize: bool = False) -> Formula:
     """Synthesizes a propositional formula in DNF over the given variables, from
     the given specification of which value the formula should have on each
     possible model over these variables.
@@ -342,9 +838,12 @@ def synthesize(variables: List[str], values: Iterable[bool]) -> Formula:
         values: iterable over truth values for the synthesized formula in every
             possible model over the given variables, in the order returned by
             `all_models`\ ``(``\ `~synthesize.variables`\ ``)``.
+        minimize: whether to synthesize a small DNF, whose clauses are merged
+            into implicants with fewer variables.
 
     Returns:
-        The synthesized formula.
+        The synthesized formula, whose clauses and disjunction are balanced
+        trees.
 
     Examples:
         #>>> formula = synthesize(['p', 'q'], [True, True, True, False])
@@ -358,36 +857,213 @@ def synthesize(variables: List[str], values: Iterable[bool]) -> Formula:
     assert len(variables) > 0
     # Task 2.7
     values = list(values)
-    models = list(all_models(variables))
-
-    synthesized_formulas = []
-    for model in models:
-        synthesized_formulas.append(synthesize_for_model(model))
-
-    formula = temp_formula = None
-    j = 0
-    for i in range(len(values)):
-        if values[i]:
-            formula = temp_formula = synthesized_formulas[i]
-            j = i
-            break
-
-    if formula is not None:
-        for i in range(j+1,len(values)):
-            if values[i]:
-                formula = Formula('|', temp_formula, synthesized_formulas[i])
-                temp_formula = formula
+    if minimize:
+        return _synthesize_minimized(variables, values)
+    clauses = [synthesize_for_model(model)
+               for model, value in zip(all_models(variables), values) if value]
+    if len(clauses) == 0:
+        clauses = [Formula('&', Formula(variable),
+                           Formula('~', Formula(variable)))
+                   for variable in variables]
+    return balanced('|', clauses)
+
+
+#: The maximal number of variables for which ``synthesize(..., minimize=True)``
+#: finds all prime implicants by the Quine-McCluskey method, rather than
+#: expanding implicants heuristically.
+EXACT_MINIMIZATION_VARIABLES = 10
+
+#: An implicant over a list of variables, as a pair of integers whose bits
+#: correspond to the variables, with the first variable at the most significant
+#: bit: the values of the variables in the implicant, and which variables occur
+#: in the implicant.
+_Implicant = Tuple[int, int]
+
+
+def _synthesize_minimized(variables: List[str], values: List[bool]) -> \
+        Formula:
+    """Synthesizes a small propositional formula in DNF over the given
+    variables, from the given specification of which value the formula should
+    have on each possible model over these variables.
+
+    Parameters:
+        variables: the variables for the synthesize formula.
+        values: truth values for the synthesized formula in every possible
+            model over the given variables, in the order returned by
+            `all_models`\ ``(``\ `variables`\ ``)``.
 
+    Returns:
+        The synthesized formula, whose clauses and disjunction are balanced
+        trees.
+    """
+    assert len(values) == 1 << len(variables)
+    size = len(values)
+    full = (1 << size) - 1
+    on = sum(1 << i for i, value in enumerate(values) if value)
+    first = Formula(variables[0])
+    if on == 0:
+        return Formula('&', first, Formula('~', first))
+    if on == full:
+        return Formula('|', first, Formula('~', first))
+    masks = _all_models_masks(variables)
+    if len(variables) <= EXACT_MINIMIZATION_VARIABLES:
+        cover = _cover_by_prime_implicants(on, variables, masks)
     else:
-        temp = []
-        for var in variables:
-            temp.append(Formula('&', Formula(var), Formula('~', Formula(var))))
-        formula = temp_formula = temp[0]
-        for i in range(1, len(temp)):
-            formula = Formula('|', temp_formula, temp[i])
-            temp_formula = formula
+        cover = _cover_by_expansion(on, variables, masks)
+    cover.sort(key=lambda implicant_models: implicant_models[1] &
+                                            -implicant_models[1])
+    clauses = []
+    for (bits, care), _ in cover:
+        literals = []
+        for j, variable in enumerate(variables):
+            bit = 1 << (len(variables) - 1 - j)
+            if care & bit:
+                literal = Formula(variable)
+                literals.append(literal if bits & bit
+                                else Formula('~', literal))
+        clauses.append(balanced('&', literals))
+    return balanced('|', clauses)
+
+
+def _implicant_models(implicant: _Implicant, variables: List[str],
+                      masks: Mapping[str, int]) -> int:
+    """Computes the models of the given implicant.
+
+    Parameters:
+        implicant: implicant to compute the models of.
+        variables: the variables of the implicant.
+        masks: the masks of the given variables, as returned by
+            `_all_models_masks`.
+
+    Returns:
+        An integer whose `i`-th bit is whether the implicant holds in the
+        `i`-th model returned by `all_models`\ ``(``\ `variables`\ ``)``.
+    """
+    bits, care = implicant
+    full = (1 << (1 << len(variables))) - 1
+    models = full
+    for j, variable in enumerate(variables):
+        bit = 1 << (len(variables) - 1 - j)
+        if care & bit:
+            models &= masks[variable] if bits & bit \
+                      else full ^ masks[variable]
+    return models
+
+
+def _cover_by_prime_implicants(on: int, variables: List[str],
+                               masks: Mapping[str, int]) -> \
+        List[Tuple[_Implicant, int]]:
+    """Covers the given models by prime implicants, found by the
+    Quine-McCluskey method, choosing all essential prime implicants, and then
+    greedily the prime implicants that cover the most uncovered models.
+
+    Parameters:
+        on: integer whose `i`-th bit is whether the `i`-th model returned by
+            `all_models`\ ``(``\ `variables`\ ``)`` is to be covered.
+        variables: the variables of the models.
+        masks: the masks of the given variables, as returned by
+            `_all_models_masks`.
+
+    Returns:
+        The chosen prime implicants, each with its models.
+    """
+    implicants = {(i, (1 << len(variables)) - 1)
+                  for i in range(1 << len(variables)) if on >> i & 1}
+    primes = []
+    while len(implicants) > 0:
+        # Two implicants that differ only in the value of a single variable
+        # are merged into an implicant without this variable; implicants that
+        # cannot be merged with any other implicant are prime.
+        merged = set()
+        used = set()
+        for bits, care in implicants:
+            remaining = care
+            while remaining != 0:
+                bit = remaining & -remaining
+                remaining ^= bit
+                if bits & bit and (bits ^ bit, care) in implicants:
+                    merged.add((bits ^ bit, care ^ bit))
+                    used.add((bits, care))
+                    used.add((bits ^ bit, care))
+        primes.extend(implicants - used)
+        implicants = merged
+    primes = [(prime, _implicant_models(prime, variables, masks))
+              for prime in sorted(primes)]
+
+    once = multiple = 0
+    for _, models in primes:
+        multiple |= once & models
+        once |= models
+    essential = once & ~multiple
+    cover = [prime for prime in primes if prime[1] & essential != 0]
+    uncovered = on
+    for _, models in cover:
+        uncovered &= ~models
+    while uncovered != 0:
+        prime = max(primes,
+                    key=lambda prime: bin(prime[1] & uncovered).count('1'))
+        cover.append(prime)
+        uncovered &= ~prime[1]
+    return cover
+
+
+def _cover_by_expansion(on: int, variables: List[str],
+                        masks: Mapping[str, int]) -> \
+        List[Tuple[_Implicant, int]]:
+    """Covers the given models by implicants in the style of the Espresso
+    heuristic: the first uncovered model is repeatedly expanded into an
+    implicant by dropping each variable whose removal does not cover any model
+    that is not to be covered, after which implicants that are covered by the
+    others are removed.
+
+    Parameters:
+        on: integer whose `i`-th bit is whether the `i`-th model returned by
+            `all_models`\ ``(``\ `variables`\ ``)`` is to be covered.
+        variables: the variables of the models.
+        masks: the masks of the given variables, as returned by
+            `_all_models_masks`.
+
+    Returns:
+        The chosen implicants, each with its models.
+    """
+    full = (1 << (1 << len(variables))) - 1
+    off = full ^ on
+    cover = []
+    uncovered = on
+    while uncovered != 0:
+        lowest = uncovered & -uncovered
+        bits = lowest.bit_length() - 1
+        care = (1 << len(variables)) - 1
+        models = lowest
+        for j, variable in enumerate(variables):
+            # Flipping the value of the `j`-th variable moves a model by
+            # `bit` positions.
+            bit = 1 << (len(variables) - 1 - j)
+            expanded = models | (models & masks[variable]) >> bit | \
+                       (models & ~masks[variable]) << bit
+            if expanded & off == 0:
+                models = expanded
+                care ^= bit
+                bits &= ~bit
+        cover.append(((bits, care), models))
+        uncovered &= ~models
+
+    # The implicants are considered from the last one, each against the
+    # implicants before it, all of which are still kept, and the kept
+    # implicants after it.
+    before = [0]
+    for _, models in cover:
+        before.append(before[-1] | models)
+    after = 0
+    kept = []
+    for k in reversed(range(len(cover))):
+        models = cover[k][1]
+        if models & ~(before[k] | after) != 0:
+            kept.append(cover[k])
+            after |= models
+    kept.reverse()
+    return kept
 
-    return formula
 
 # Tasks for Chapter 4
 
@@ -406,27 +1082,38 @@ def evaluate_inference(rule: InferenceRule, model: Model) -> bool:
     assert is_model(model)
     # Task 4.2
 
-    truth_values_of_assumptions = []
     for assumption in rule.assumptions:
-        truth_values_of_assumptions.append(evaluate(assumption, model))
-    if False not in truth_values_of_assumptions and not evaluate(rule.conclusion, model):
-        return False
-    return True
+        if not evaluate(assumption, model):
+            return True
+    return evaluate(rule.conclusion, model)
 
 
-def is_sound_inference(rule: InferenceRule) -> bool:
+def is_sound_inference(rule: InferenceRule,
+                       backend: str = 'truth_table') -> bool:
     """Checks if the given inference rule is sound, i.e., whether its
     conclusion is a semantically correct implication of its assumptions.
 
     Parameters:
         rule: inference rule to check.
+        backend: ``'truth_table'`` to check all models, ``'parallel'`` to
+            check them in worker processes, ``'sat'`` to search for a model
+            with `~propositions.sat.Solver`, or ``'bdd'`` to build a
+            `~propositions.bdd.BDD`.
 
     Returns:
         ``True`` if the given inference rule is sound, ``False`` otherwise.
     """
+    assert backend in BACKENDS
     # Task 4.3
-    models = all_models(list(rule.variables()))
-    for model in models:
-        if not evaluate_inference(rule, model):
-            return False
-    return True
+    if backend == 'sat':
+        return find_model(rule.assumptions +
+                          (Formula('~', rule.conclusion),)) is None
+    if backend == 'bdd':
+        manager = BDD(sorted(rule.variables()))
+        holding = BDD.TRUE
+        for assumption in rule.assumptions:
+            holding = manager.apply('&', holding, manager.build(assumption))
+        return manager.apply('->', holding, manager.build(rule.conclusion)) \
+               == BDD.TRUE
+    return _sweep(rule.assumptions, rule.conclusion, list(rule.variables()),
+                  backend == 'parallel')
@@ -7,10 +7,32 @@
 
 from logic_utils import frozendict
 
+import propositions.semantics
 from propositions.syntax import *
 from propositions.semantics import *
 from propositions.axiomatic_systems import *
 
+#: Formulae over all operators and constants, on which every backend of
+#: `is_tautology` and its siblings is checked against the default one.
+many_fs = ['F', 'T', 'r', '~x', '(x+y)', '(x<->y)', '(x-&y)', '(x-|y)', '(x|y)',
+           '(x->y)', '(x&y)', '(x&~x)', '(p&q)', '(x|(y&z))', '~(~x|~(y|z))',
+           '((p1|~p2)|~(p3|~~p4))', '((x+y)<->(~x+~y))', '((x+y)<->(~x+y))',
+           '((x-|~y)&(~F->(z<->T)))', '~~~~F', '((p->q)&((q->r)&(r->~p)))',
+           '(((p->q)&((q->r)&(r->~p)))&p)']
+
+def check_backend(backend, debug=False):
+    """Checks the given backend against the default one on `many_fs`."""
+    for infix in many_fs:
+        formula = Formula.parse(infix)
+        if debug:
+            print('Testing the', backend, 'backend on', formula)
+        for check in [is_tautology, is_contradiction, is_satisfiable]:
+            assert check(formula, backend) == check(formula)
+        rule = InferenceRule([Formula.parse('(x|y)'), formula],
+                             Formula.parse('(x&r)'))
+        assert is_sound_inference(rule, backend) == is_sound_inference(rule)
+        assert is_sound_inference(InferenceRule([formula], formula), backend)
+
 def test_evaluate(debug=False):
     infix1 = '~(p&q7)'
     models_values1 = [
@@ -51,6 +73,33 @@ def test_evaluate(debug=False):
                       model)
             assert evaluate(formula, frozendict(model)) == value
 
+def test_evaluate_deep_formula(debug=False):
+    depth = 10**5
+    if debug:
+        print('Testing evaluation of a formula of depth', depth)
+    formula = Formula('p')
+    for i in range(depth):
+        formula = Formula('~', formula) if i % 2 else \
+                  Formula('&', formula, Formula('q'))
+    assert evaluate(formula, {'p': True, 'q': True})
+    assert not evaluate(formula, {'p': False, 'q': True})
+
+def test_compile_formula(debug=False):
+    for infix in ['~(p&q7)', '(y|~x)', '((x->y)<->(z+~x))', '((p-&q)-|T)',
+                  '(F|~r)', 'T', 'p']:
+        formula = Formula.parse(infix)
+        if debug:
+            print('Testing compilation of', formula)
+        compiled = compile_formula(formula)
+        assert compile_formula(Formula.parse(infix)) is compiled
+        assert compiled.variables == tuple(sorted(formula.variables()))
+        for model in all_models(list(compiled.variables)):
+            value = compiled(*model.values())
+            assert type(value) is bool
+            for i in range(COMPILE_THRESHOLD + 1):
+                assert evaluate(formula, frozendict(model)) == value
+            assert evaluate_bitwise(formula, model, 1) == value
+
 def test_all_models(debug=False):
     variables1 = ('p', 'q')
     models1 = [{'p': False, 'q': False}, \
@@ -77,6 +126,99 @@ def test_truth_values(debug=False):
         assert tvals == values, \
                'Expected ' + str(values) + '; got ' + str(tvals)
 
+def test_lazy_models(debug=False):
+    from itertools import islice
+    variables = ['x' + str(i) for i in range(40)]
+    if debug:
+        print('Testing lazy models over', len(variables), 'variables')
+    assert next(iter(all_models(variables))) == \
+           {variable: False for variable in variables}
+    wide = Formula('x0')
+    for variable in variables[1:]:
+        wide = Formula('|', wide, Formula(variable))
+    assert list(islice(truth_values(wide, all_models(variables)), 3)) == \
+           [False, True, True]
+    assert not is_tautology(wide)
+    assert is_satisfiable(wide)
+    assert not is_contradiction(wide)
+    assert not is_sound_inference(InferenceRule([wide], Formula('x1')))
+
+def test_truth_table(debug=False):
+    for infix in ['~(p&q7)', '(y|~x)', '((x->y)<->(z+~x))', '((p-&q)-|T)',
+                  '(F|~r)']:
+        formula = Formula.parse(infix)
+        variables = sorted(formula.variables()) + ['s']
+        if debug:
+            print('Testing the truth table of', formula, 'over', variables)
+        table = truth_table(formula, variables)
+        for i, model in enumerate(all_models(variables)):
+            assert bool(table >> i & 1) == evaluate(formula, model)
+    assert truth_table(Formula('T'), []) == 1
+    assert truth_table(Formula('F'), []) == 0
+
+def test_truth_table_cache(debug=False):
+    if debug:
+        print('Testing the truth table cache')
+    cache = TruthTableCache(2)
+    assert cache.is_tautology(Formula.parse('(x|~x)'))
+    assert cache.is_tautology(Formula.parse('(z7|~z7)'))
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not cache.is_tautology(Formula.parse('(x|~y)'))
+    assert not cache.is_tautology(Formula.parse('(y|~x)'))
+    assert (cache.hits, cache.misses) == (2, 2)
+    variables, table = cache.truth_table(Formula.parse('(q->p)'))
+    assert variables == ('q', 'p') and table == 0b1011
+    assert not cache.is_tautology(Formula.parse('(s->r)'))
+    assert not cache.is_contradiction(Formula.parse('(r->s)'))
+    assert (cache.hits, cache.misses) == (4, 3)
+    assert len(cache) == 2
+    assert cache.is_contradiction(Formula.parse('(r&~r)'))
+    assert not cache.is_tautology(Formula.parse('(y|~x)'))
+    assert (cache.hits, cache.misses) == (4, 5)
+    cache.clear()
+    assert len(cache) == 0 and (cache.hits, cache.misses) == (0, 0)
+
+def test_parallel(debug=False):
+    if debug:
+        print('Testing the parallel backend on small blocks of models')
+    block_variables = propositions.semantics.BLOCK_VARIABLES
+    workers = propositions.semantics.PARALLEL_WORKERS
+    propositions.semantics.BLOCK_VARIABLES = 2
+    propositions.semantics.PARALLEL_WORKERS = 2
+    try:
+        wide = Formula('x0')
+        for i in range(1, 8):
+            wide = Formula('|', wide, Formula('x' + str(i)))
+        assert is_satisfiable(wide, 'parallel')
+        assert not is_tautology(wide, 'parallel')
+        assert is_tautology(Formula('|', wide, Formula('~', Formula('x7'))),
+                            'parallel')
+        assert is_contradiction(Formula('&', Formula('~', wide),
+                                        Formula('x3')), 'parallel')
+        assert is_sound_inference(
+            InferenceRule([wide, Formula('~', Formula('x0'))],
+                          Formula.parse('(x1|(x2|(x3|(x4|(x5|(x6|x7))))))')),
+            'parallel')
+        assert not is_sound_inference(InferenceRule([wide], Formula('x1')),
+                                      'parallel')
+        variables = ['x' + str(i) for i in range(8)]
+        assert list(truth_values(wide, all_models(variables), True)) == \
+               list(truth_values(wide, all_models(variables)))
+        values = truth_values(wide, all_models(variables), True)
+        assert next(values) is False
+        values.close()
+        deep = Formula('|', Formula('x0'), Formula('~', Formula('x0')))
+        for i in range(2000):
+            deep = Formula('->', Formula('x' + str(i % 8)), deep)
+        assert is_tautology(deep, 'parallel')
+        assert not is_tautology(Formula('&', wide, deep), 'parallel')
+        assert list(truth_values(Formula('&', wide, deep),
+                                 all_models(variables), True)) == \
+               list(truth_values(wide, all_models(variables)))
+    finally:
+        propositions.semantics.BLOCK_VARIABLES = block_variables
+        propositions.semantics.PARALLEL_WORKERS = workers
+
 def test_print_truth_table(debug=False):
     infix1 = '~r'
     table1 = '| r | ~r |\n' \
@@ -148,6 +290,31 @@ def __test_print_truth_table(infixes, tables, debug):
         assert re.sub('[ -]+', ' ', capturer.captured) == \
                re.sub('[ -]+', ' ', table)
 
+def test_print_truth_table_styles(debug=False):
+    from io import StringIO
+
+    formula = Formula.parse('(x&(~z|y))')
+    if debug:
+        print('Testing writing the truth table of', formula, 'in styles')
+    output = StringIO()
+    print_truth_table(formula, output, 'csv')
+    assert output.getvalue() == 'x,y,z,(x&(~z|y))\n' \
+                                'F,F,F,F\nF,F,T,F\nF,T,F,F\nF,T,T,F\n' \
+                                'T,F,F,T\nT,F,T,F\nT,T,F,T\nT,T,T,T\n'
+    output = StringIO()
+    print_truth_table(Formula('T'), output, 'tsv')
+    assert output.getvalue() == 'T\nT\n'
+    table = StringIO()
+    print_truth_table(formula, table)
+    block_variables = propositions.semantics.BLOCK_VARIABLES
+    propositions.semantics.BLOCK_VARIABLES = 1
+    try:
+        output = StringIO()
+        print_truth_table(formula, output)
+    finally:
+        propositions.semantics.BLOCK_VARIABLES = block_variables
+    assert output.getvalue() == table.getvalue()
+
 def test_is_tautology(debug=False):
     for infix,answer in [['~(p&q7)',   False], ['(x|~x)',       True],
                             ['(p->q)', False], ['(p->p)', True],
@@ -301,6 +468,45 @@ def test_synthesize(debug=False):
                        str(formula) + ' does not evaluate to ' + str(value) + \
                        ' on ' + str(model)
 
+def test_synthesize_minimized(debug=False):
+    import random
+    random.seed(0)
+    exact_variables = propositions.semantics.EXACT_MINIMIZATION_VARIABLES
+    for exact in [True, False]:
+        propositions.semantics.EXACT_MINIMIZATION_VARIABLES = \
+            exact_variables if exact else 0
+        try:
+            for n in range(1, 7):
+                variables = ['p' + str(j) for j in range(n)]
+                for _ in range(10):
+                    values = [random.random() < 0.5 for _ in range(1 << n)]
+                    if debug:
+                        print('Testing minimized synthesis for variables',
+                              variables, 'and model-values', values)
+                    formula = synthesize(variables, values, True)
+                    assert is_DNF(formula), str(formula) + ' should be a DNF'
+                    assert list(truth_values(formula,
+                                             all_models(variables))) == values
+            values = [model['p0'] or (model['p1'] and not model['p2'])
+                      for model in all_models(['p0', 'p1', 'p2', 'p3'])]
+            assert synthesize(['p0', 'p1', 'p2', 'p3'], values, True) == \
+                   Formula.parse('((p1&~p2)|p0)')
+        finally:
+            propositions.semantics.EXACT_MINIMIZATION_VARIABLES = \
+                exact_variables
+    variables = ['x' + str(j) for j in range(14)]
+    values = [model['x3'] or model['x11'] for model in all_models(variables)]
+    if debug:
+        print('Testing minimized synthesis of a wide disjunction')
+    assert synthesize(variables, values, True) == \
+           Formula.parse('(x11|x3)')
+    values = [random.random() < 0.5 for _ in range(1 << 14)]
+    if debug:
+        print('Testing minimized synthesis of a random function of 14 '
+              'variables')
+    formula = synthesize(variables, values, True)
+    assert list(truth_values(formula, all_models(variables))) == values
+
 def is_DNF(formula):
     return is_clause(formula) or \
            (formula.root == '|' and is_DNF(formula.first) and
@@ -410,14 +616,21 @@ def test_is_tautology_all_operators(debug=False):
 
 def test_ex2(debug=False):
     test_evaluate(debug)
+    test_compile_formula(debug)
     test_all_models(debug)
     test_truth_values(debug)
+    test_lazy_models(debug)
+    test_truth_table(debug)
+    test_truth_table_cache(debug)
+    test_parallel(debug)
     test_print_truth_table(debug)
+    test_print_truth_table_styles(debug)
     test_is_tautology(debug)
     test_is_contradiction(debug)
     test_is_satisfiable(debug)
     test_synthesize_for_model(debug)
     test_synthesize(debug)
+    test_synthesize_minimized(debug)
 
 def test_ex3(debug=False):
     assert is_binary('+'), 'Change is_binary() before testing Chapter 3 tasks.'
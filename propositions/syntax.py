@@ -6,7 +6,9 @@
 """Syntactic handling of propositional formulae."""
 
 from __future__ import annotations
-from typing import Mapping, Optional, Set, Tuple, Union
+from typing import Callable, Iterable, Iterator, Mapping, Optional, Sequence, \
+                   Set, TextIO, Tuple, TypeVar, Union
+from weakref import WeakValueDictionary
 
 from logic_utils import frozen
 
@@ -62,6 +64,66 @@ def is_binary(s: str) -> bool:
     # return s in {'&', '|',  '->', '+', '<->', '-&', '-|'}
 
 
+def _parse_binary_operator(s: str, i: int) -> Optional[str]:
+    """Finds the binary operator that starts at the given position of the given
+    string.
+
+    Parameters:
+        s: string to scan.
+        i: position in the string at which the operator should start.
+
+    Returns:
+        The binary operator that starts at the given position, or ``None`` if
+        no binary operator starts there.
+    """
+    for length in (3, 2, 1):
+        if is_binary(s[i:i + length]):
+            return s[i:i + length]
+    return None
+
+
+_T = TypeVar('_T')
+
+#: Whether newly constructed formulae are interned, see `set_interning`.
+_interning_enabled = True
+#: The interned formulae, keyed by their root and (interned) operands.
+_interned_formulae = WeakValueDictionary()
+
+
+def set_interning(enabled: bool) -> None:
+    """Turns interning of newly constructed formulae on or off.
+
+    While interning is on (the default), constructing a formula that is
+    structurally identical to a live interned formula returns that very
+    formula object instead of a new one, so that structurally identical
+    formulae share a single node and two interned formulae are equal if and
+    only if they are the same object. Formulae constructed while interning is
+    off are ordinary distinct objects, which are still compared structurally.
+
+    Parameters:
+        enabled: whether to intern formulae constructed from now on.
+    """
+    global _interning_enabled
+    _interning_enabled = enabled
+
+
+def _unpickle_formula(nodes: Sequence[tuple]) -> Formula:
+    """Reconstructs a pickled formula.
+
+    Parameters:
+        nodes: the distinct subformulae of the formula, each as a tuple of its
+            root followed by the positions of its operands in this sequence,
+            where each subformula appears after its operands.
+
+    Returns:
+        The last subformula in the given sequence.
+    """
+    formulae = []
+    for root, *operands in nodes:
+        formulae.append(Formula(root, *[formulae[i] for i in operands]))
+    return formulae[-1]
+
+
 @frozen
 class Formula:
     """An immutable propositional formula in tree representation.
@@ -78,6 +140,29 @@ class Formula:
     first: Optional[Formula]
     second: Optional[Formula]
 
+    def __new__(cls, root: Optional[str] = None,
+                first: Optional[Formula] = None,
+                second: Optional[Formula] = None) -> Formula:
+        """Returns the live interned formula with the given root and root
+        operands if interning is on and there is one, or a new uninitialized
+        formula otherwise.
+
+        Parameters:
+            root: the root for the formula tree.
+            first: the first operand to the root, if the root is a unary or
+                binary operator.
+            second: the second operand to the root, if the root is a binary
+                operator.
+
+        Returns:
+            The interned formula, or a new formula to be initialized.
+        """
+        if _interning_enabled and root is not None:
+            formula = _interned_formulae.get((root, first, second))
+            if formula is not None:
+                return formula
+        return super().__new__(cls)
+
     def __init__(self, root: str, first: Optional[Formula] = None,
                  second: Optional[Formula] = None) -> None:
         """Initializes a `Formula` from its root and root operands.
@@ -89,6 +174,9 @@ class Formula:
             second: the second operand to the root, if the root is a binary
                 operator.
         """
+        if '_hash' in self.__dict__:
+            # An already-initialized interned formula returned by __new__.
+            return
         if is_variable(root) or is_constant(root):
             assert first is None and second is None
             self.root = root
@@ -99,6 +187,34 @@ class Formula:
             assert is_binary(root) and type(first) is Formula and \
                    type(second) is Formula
             self.root, self.first, self.second = root, first, second
+        # The operands already hold their structural hashes, so this is O(1).
+        self._hash = hash((root, first, second))
+        self._interned = _interning_enabled and \
+            _interned_formulae.setdefault((root, first, second), self) is self
+
+    def __copy__(self) -> Formula:
+        return self
+
+    def __deepcopy__(self, memo: dict) -> Formula:
+        return self
+
+    def __reduce__(self) -> tuple:
+        # A formula is pickled as the flat list of its distinct subformulae,
+        # each referring to its operands by their positions in the list, so
+        # that formulae of any depth can be pickled, and shared subformulae
+        # are pickled once.
+        numbers = {}
+        nodes = []
+        for subformula in self.subformulae():
+            numbers[id(subformula)] = len(nodes)
+            if is_binary(subformula.root):
+                nodes.append((subformula.root, numbers[id(subformula.first)],
+                              numbers[id(subformula.second)]))
+            elif is_unary(subformula.root):
+                nodes.append((subformula.root, numbers[id(subformula.first)]))
+            else:
+                nodes.append((subformula.root,))
+        return _unpickle_formula, (nodes,)
 
     def __eq__(self, other: object) -> bool:
         """Compares the current formula with the given one.
@@ -110,7 +226,26 @@ class Formula:
             ``True`` if the given object is a `Formula` object that equals the
             current formula, ``False`` otherwise.
         """
-        return isinstance(other, Formula) and str(self) == str(other)
+        if self is other:
+            return True
+        if not isinstance(other, Formula) or self._hash != other._hash:
+            return False
+        if self._interned and other._interned:
+            return False
+        pairs = [(self, other)]
+        while pairs:
+            formula1, formula2 = pairs.pop()
+            if formula1 is formula2:
+                continue
+            if formula1._hash != formula2._hash or \
+                    formula1.root != formula2.root:
+                return False
+            if is_unary(formula1.root):
+                pairs.append((formula1.first, formula2.first))
+            elif is_binary(formula1.root):
+                pairs.append((formula1.first, formula2.first))
+                pairs.append((formula1.second, formula2.second))
+        return True
 
     def __ne__(self, other: object) -> bool:
         """Compares the current formula with the given one.
@@ -125,7 +260,7 @@ class Formula:
         return not self == other
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        return self._hash
 
     def __repr__(self) -> str:
         """Computes the string representation of the current formula.
@@ -134,29 +269,89 @@ class Formula:
             The standard string representation of the current formula.
 
         # Task 1.1
-    """
-        temp_arr = list()
-
-        def helper_repr(self, temp_arr):
-            if self.root is None:
-                return ""
-            elif is_constant(self.root) or is_variable(self.root):
-                temp_arr.append(self.root)
-            elif is_unary(self.root):
-                temp_arr.append(self.root)
-                helper_repr(self.first, temp_arr)
-            elif is_binary(self.root):
-                temp_arr.append("(")
-                helper_repr(self.first, temp_arr)
-                temp_arr.append(self.root)
-                helper_repr(self.second, temp_arr)
-                temp_arr.append(")")
-            return str(temp_arr)
-
-        helper_repr(self, temp_arr)
-        rep = ''.join(temp_arr)
+        """
+        rep = self.__dict__.get('_repr')
+        if rep is not None:
+            return rep
+        tokens = []
+        pending = [self]
+        while pending:
+            item = pending.pop()
+            if type(item) is str:
+                tokens.append(item)
+                continue
+            rep = item.__dict__.get('_repr')
+            if rep is not None:
+                # Reuse the already-rendered string of this subformula.
+                tokens.append(rep)
+            elif is_unary(item.root):
+                tokens.append(item.root)
+                pending.append(item.first)
+            elif is_binary(item.root):
+                tokens.append('(')
+                pending.extend((')', item.second, item.root, item.first))
+            else:
+                tokens.append(item.root)
+        rep = ''.join(tokens)
+        # The formula is immutable, so its rendering is computed only once.
+        # Memoizing it does not change the value of the formula, hence the
+        # bypass of the frozen __setattr__.
+        object.__setattr__(self, '_repr', rep)
         return rep
 
+    def subformulae(self) -> Iterator[Formula]:
+        """Iterates over the distinct subformulae of the current formula,
+        including the current formula itself, using an explicit stack rather
+        than recursion so that formulae of any depth can be traversed.
+
+        Returns:
+            An iterator over the subformulae of the current formula, each
+            subformula object appearing once, where each subformula appears
+            after its operands.
+        """
+        visited = set()
+        pending = [(self, False)]
+        while pending:
+            formula, expanded = pending.pop()
+            if expanded:
+                yield formula
+                continue
+            if id(formula) in visited:
+                continue
+            visited.add(id(formula))
+            pending.append((formula, True))
+            if is_binary(formula.root):
+                pending.append((formula.second, False))
+                pending.append((formula.first, False))
+            elif is_unary(formula.root):
+                pending.append((formula.first, False))
+
+    def fold(self,
+             visit: Callable[[Formula, Optional[_T], Optional[_T]], _T]) -> _T:
+        """Computes a value for the current formula bottom-up, from the values
+        computed for its operands, without recursion.
+
+        Parameters:
+            visit: function that is given a subformula, and the values
+                computed for its first and second operands (``None`` for
+                missing operands), and returns the value for that subformula.
+                It is called once per distinct subformula object.
+
+        Returns:
+            The value computed for the current formula.
+        """
+        values = {}
+        for formula in self.subformulae():
+            if is_binary(formula.root):
+                value = visit(formula, values[id(formula.first)],
+                              values[id(formula.second)])
+            elif is_unary(formula.root):
+                value = visit(formula, values[id(formula.first)], None)
+            else:
+                value = visit(formula, None, None)
+            values[id(formula)] = value
+        return values[id(self)]
+
     def variables(self) -> Set[str]:
         """Finds all atomic propositions (variables) in the current formula.
 
@@ -165,25 +360,14 @@ class Formula:
 
         # Task 1.2
         """
-        temp_set = set()
-
-        def helper_variables(self, temp_set):
-            if self.root is None or is_constant(self.root):
-                return
-            elif is_variable(self.root):
-                temp_set.add(self.root)
-                return
-            elif is_unary(self.root):
-                helper_variables(self.first, temp_set)
-            elif is_binary(self.root):
-                helper_variables(self.first, temp_set)
-                helper_variables(self.second, temp_set)
-                return
-
-            return temp_set
-
-        helper_variables(self, temp_set)
-        return temp_set
+        variables = self.__dict__.get('_variables')
+        if variables is None:
+            variables = frozenset(formula.root
+                                  for formula in self.subformulae()
+                                  if is_variable(formula.root))
+            # Memoized like the string representation, see `__repr__`.
+            object.__setattr__(self, '_variables', variables)
+        return set(variables)
 
     def operators(self) -> Set[str]:
         """Finds all operators in the current formula.
@@ -194,27 +378,9 @@ class Formula:
 
         # Task 1.3
         """
-        temp_set = set()
+        return {formula.root for formula in self.subformulae()
+                if not is_variable(formula.root)}
 
-        def helper_operators(self, temp_set):
-            if self.root is None or is_variable(self.root):
-                return
-            else:
-                temp_set.add(self.root)
-                if is_constant(self.root):
-                    return
-                elif is_unary(self.root):
-                    helper_operators(self.first, temp_set)
-                elif is_binary(self.root):
-                    helper_operators(self.first, temp_set)
-                    helper_operators(self.second, temp_set)
-                    return
-
-            return temp_set
-
-        helper_operators(self, temp_set)
-        return temp_set
-        
     @staticmethod
     def parse_prefix(s: str) -> Tuple[Union[Formula, None], str]:
         """Parses a prefix of the given string into a formula.
@@ -234,120 +400,57 @@ class Formula:
         # Task 1.4
         assert type(s) is str
 
-        def parse_constant(s):
-            const = s[0]
-            tempS = s[1:]
-            return "Formula('" + const + "')", tempS
-
-        def parse_variable(s):
-            var = s[:1]
-            tempS = s[1:]
-            i = 1
-
-            if i < len(s) and s[1] == '0':
-                var = s[:2]
-                tempS = s[2:]
-                return "Formula('" + var + "')", tempS
-
-            while i < len(s):
-                if s[i] >= '0' and s[i] <= '9':
-                    i = i + 1
-                    var = s[:i]
-                    tempS = s[i:]
-
-                else:
+        # The string is scanned once, left to right, keeping an explicit stack
+        # of the operators still waiting for their operands: a pending '~',
+        # an opened '(' waiting for its first operand, or a binary operator
+        # (together with its already-parsed first operand) waiting for its
+        # second operand.
+        pending = []
+        i = 0
+        n = len(s)
+        while True:
+            if i >= n:
+                return None, 'Error: Unexpected end of string'
+            c = s[i]
+            if is_unary(c) or c == '(':
+                pending.append(c)
+                i += 1
+                continue
+            if is_constant(c):
+                formula = Formula(c)
+                i += 1
+            elif 'p' <= c <= 'z':
+                j = i + 1
+                while j < n and '0' <= s[j] <= '9':
+                    j += 1
+                formula = Formula(s[i:j])
+                i = j
+            else:
+                return None, 'Error: Unexpected symbol ' + repr(c) + \
+                       ' at position ' + str(i)
+
+            while pending:
+                top = pending[-1]
+                if is_unary(top):
+                    pending.pop()
+                    formula = Formula(top, formula)
+                elif top == '(':
+                    operator = _parse_binary_operator(s, i)
+                    if operator is None:
+                        return None, 'Error: Expected a binary operator at ' \
+                                     'position ' + str(i)
+                    i += len(operator)
+                    pending[-1] = (operator, formula)
                     break
-
-            return "Formula('" + var + "')", tempS
-
-        def parse_unary(s):
-            tempS = s[1:]
-            f = ""
-
-            def parse_unary_helper(tempS, f):
-                if tempS:
-                    if tempS[0] == 'T' or tempS[0] == 'F':
-                        f, tempS = parse_constant(tempS)
-                    elif tempS[0] >= 'p' and tempS[0] <= 'z':
-                        f, tempS = parse_variable(tempS)
-                    elif tempS[0] == '~':
-                        f, tempS = parse_unary_helper(tempS[1:], f)
-                    elif tempS[0] == '(':
-                        f, tempS = parse_binary(tempS)
-
-                    return "Formula('~', " + f + ")", tempS
-                return "", s
-
-            return parse_unary_helper(tempS, f)
-
-        def parse_binary(s):
-            def parse_binary_helper(tempS, f1, f2):
-                # s[0] == '('
-                tempS = tempS[1:]
-                op = ""
-
-                if tempS:
-                    if tempS[0] == 'T' or tempS[0] == 'F':
-                        f1, tempS = parse_constant(tempS)
-                    elif tempS[0] >= 'p' and tempS[0] <= 'z':
-                        f1, tempS = parse_variable(tempS)
-                    elif tempS[0] == '~':
-                        f1, tempS = parse_unary(tempS)
-                    elif tempS[0] == '(':
-                        f1, tempS = parse_binary(tempS)
-
-                if tempS and (tempS[0] == '&' or tempS[0] == '|' or tempS[0] == '+'):
-                    op = tempS[0]
-                    tempS = tempS[1:]
-
-                elif tempS and \
-                        ((tempS[0] == '-' and tempS[1] == '>')
-                         or (tempS[0] == '-' and tempS[1] == '&')
-                         or (tempS[0] == '-' and tempS[1] == '|')):
-                    op = tempS[:2]
-                    tempS = tempS[2:]
-                elif tempS and tempS[:3] == '<->':
-                    op = tempS[:3]
-                    tempS = tempS[3:]
                 else:
-                    return "", tempS
-
-                if tempS:
-                    if tempS[0] == 'T' or tempS[0] == 'F':
-                        f2, tempS = parse_constant(tempS)
-                    elif tempS[0] >= 'p' and tempS[0] <= 'z':
-                        f2, tempS = parse_variable(tempS)
-                    elif tempS[0] == '~':
-                        f2, tempS = parse_unary(tempS)
-                    elif tempS[0] == '(':
-                        f2, tempS = parse_binary(tempS)
-
-                if tempS and tempS[0] == ')':
-                    tempS = tempS[1:]
-                    return "Formula('" + op + "', " + f1 + ", " + f2 + ")", tempS
-                return "", reminder
-
-            f1 = f2 = ""
-            return parse_binary_helper(s, f1, f2)
-
-        def parse_prefix_helper(s, formula_str_repr, reminder):
-            if s :
-                if s[0] == 'T' or s[0] == 'F':
-                    formula_str_repr, reminder = parse_constant(reminder)
-                elif s[0] >= 'p' and s[0] <= 'z':
-                    formula_str_repr, reminder = parse_variable(reminder)
-                elif s[0] == '~':
-                    formula_str_repr, reminder = parse_unary(reminder)
-                elif s[0] == '(':
-                    formula_str_repr, reminder = parse_binary(reminder)
-            return formula_str_repr, reminder
-
-        reminder = s[:]
-        formula_str_repr = ""
-        formula_str_repr, reminder = parse_prefix_helper(s, formula_str_repr, reminder)
-        if formula_str_repr == "":
-            return None, "Error: Invalid Formula"
-        return eval(formula_str_repr), reminder
+                    if i >= n or s[i] != ')':
+                        return None, "Error: Expected ')' at position " + \
+                               str(i)
+                    i += 1
+                    pending.pop()
+                    formula = Formula(top[0], top[1], formula)
+            else:
+                return formula, s[i:]
 
     @staticmethod
     def is_formula(s: str) -> bool:
@@ -374,9 +477,10 @@ class Formula:
         Returns:
             A formula whose standard string representation is the given string.
         """
-        assert Formula.is_formula(s)
         # Task 1.6
-        return Formula.parse_prefix(s)[0]
+        formula, remainder = Formula.parse_prefix(s)
+        assert formula is not None and remainder == ''
+        return formula
 
 # Optional tasks for Chapter 1
 
@@ -387,6 +491,17 @@ class Formula:
             The polish notation representation of the current formula.
         """
         # Optional Task 1.7
+        tokens = []
+        pending = [self]
+        while pending:
+            formula = pending.pop()
+            tokens.append(formula.root)
+            if is_binary(formula.root):
+                pending.append(formula.second)
+                pending.append(formula.first)
+            elif is_unary(formula.root):
+                pending.append(formula.first)
+        return ''.join(tokens)
 
     @staticmethod
     def parse_polish(s: str) -> Formula:
@@ -399,6 +514,42 @@ class Formula:
             A formula whose polish notation representation is the given string.
         """
         # Optional Task 1.8
+        # Each operator waits on the stack, with the operands parsed so far,
+        # until all of its operands have been parsed.
+        pending = []
+        i = 0
+        n = len(s)
+        while True:
+            assert i < n, 'Unexpected end of polish notation ' + repr(s)
+            c = s[i]
+            operator = c if is_unary(c) else _parse_binary_operator(s, i)
+            if operator is not None:
+                pending.append((operator, []))
+                i += len(operator)
+                continue
+            if is_constant(c):
+                formula = Formula(c)
+                i += 1
+            else:
+                assert 'p' <= c <= 'z', 'Unexpected symbol ' + repr(c) + \
+                                        ' in polish notation ' + repr(s)
+                j = i + 1
+                while j < n and '0' <= s[j] <= '9':
+                    j += 1
+                formula = Formula(s[i:j])
+                i = j
+
+            while pending:
+                operator, operands = pending[-1]
+                operands.append(formula)
+                if is_binary(operator) and len(operands) < 2:
+                    break
+                pending.pop()
+                formula = Formula(operator, *operands)
+            else:
+                assert i == n, 'Unexpected suffix ' + repr(s[i:]) + \
+                               ' in polish notation ' + repr(s)
+                return formula
 
 # Tasks for Chapter 3
 
@@ -423,24 +574,21 @@ class Formula:
             assert is_variable(variable)
         # Task 3.3
 
-        if is_constant(self.root):
-            return self
-        elif is_variable(self.root):
-            if self.root in substitution_map.keys():
-                return substitution_map[self.root]
-            else:
-                return self
-        elif is_unary(self.root):
-            first = Formula.substitute_variables(self.first, substitution_map)
-            return Formula(self.root, first)
-        elif is_binary(self.root):
-            first = Formula.substitute_variables(self.first, substitution_map)
-            second = Formula.substitute_variables(self.second, substitution_map)
-            return Formula(self.root, first, second)
-        return self
-
-
-
+        def substitute(formula: Formula, first: Optional[Formula],
+                       second: Optional[Formula]) -> Formula:
+            if is_variable(formula.root):
+                return substitution_map.get(formula.root, formula)
+            elif is_unary(formula.root):
+                if first is formula.first:
+                    return formula
+                return Formula(formula.root, first)
+            elif is_binary(formula.root):
+                if first is formula.first and second is formula.second:
+                    return formula
+                return Formula(formula.root, first, second)
+            return formula
+
+        return self.fold(substitute)
 
     def substitute_operators(
             self, substitution_map: Mapping[str, Formula]) -> Formula:
@@ -468,30 +616,83 @@ class Formula:
 
             assert substitution_map[operator].variables().issubset({'p', 'q'})
         # Task 3.4
-        if is_constant(self.root):
-            if self.root in substitution_map.keys():
-                return substitution_map[self.root]
-            else:
-                return self
 
-        if is_variable(self.root):
-            return self
+        def substitute(formula: Formula, first: Optional[Formula],
+                       second: Optional[Formula]) -> Formula:
+            if is_variable(formula.root):
+                return formula
+            elif formula.root in substitution_map:
+                operands = {}
+                if first is not None:
+                    operands['p'] = first
+                if second is not None:
+                    operands['q'] = second
+                return substitution_map[formula.root].substitute_variables(
+                    operands)
+            elif is_unary(formula.root):
+                return Formula(formula.root, first)
+            elif is_binary(formula.root):
+                return Formula(formula.root, first, second)
+            return formula
+
+        return self.fold(substitute)
+
+
+def write_polish(formulae: Iterable[Formula], file: TextIO) -> None:
+    """Writes the polish notation representations of the given formulae to the
+    given file, one formula per line.
 
-        elif is_binary(self.root):
-            first = Formula.substitute_operators(self.first, substitution_map)
-            second = Formula.substitute_operators(self.second, substitution_map)
-            if self.root in substitution_map.keys():
-                temp = substitution_map[self.root]
-            else:
-                temp = Formula(self.root, Formula('p'), Formula('q'))
-            return Formula.substitute_variables(temp, {'p': first, 'q': second})
+    Parameters:
+        formulae: formulae to write.
+        file: text file to write to.
+    """
+    for formula in formulae:
+        file.write(formula.polish())
+        file.write('\n')
 
-        elif is_unary(self.root):
-            first = Formula.substitute_operators(self.first, substitution_map)
-            if self.root in substitution_map.keys():
-                temp = substitution_map[self.root]
-            else:
-                temp = Formula(self.root, Formula('p'))
-            return Formula.substitute_variables(temp, {'p': first})
 
-        return self
+def read_polish(file: Iterable[str]) -> Iterator[Formula]:
+    """Lazily parses formulae from the given file of polish notation
+    representations, one formula per line, as written by `write_polish`.
+
+    Parameters:
+        file: text file (or any iterable over lines) to read from. Blank lines
+            are skipped.
+
+    Returns:
+        An iterator over the parsed formulae, in the order of their lines.
+    """
+    for line in file:
+        line = line.strip()
+        if line != '':
+            yield Formula.parse_polish(line)
+
+
+def balanced(operator: str, formulae: Sequence[Formula]) -> Formula:
+    """Combines the given formulae by the given associative operator into a
+    balanced tree.
+
+    Parameters:
+        operator: ``'&'`` or ``'|'``.
+        formulae: formulae to combine.
+
+    Returns:
+        A formula of logarithmic depth in the number of the given formulae,
+        that combines them in their given order by the given operator, or the
+        neutral constant of the operator if there are no formulae to combine.
+
+    Examples:
+        >>> balanced('&', [Formula('p'), Formula('q'), Formula('r'),
+        ...                Formula('s'), Formula('t')])
+        (((p&q)&(r&s))&t)
+        >>> balanced('|', [])
+        F
+    """
+    assert operator in ('&', '|')
+    if len(formulae) == 0:
+        return Formula('T' if operator == '&' else 'F')
+    while len(formulae) > 1:
+        formulae = [Formula(operator, formulae[i], formulae[i + 1])
+                    if i + 1 < len(formulae) else formulae[i]
+                    for i in range(0, len(formulae), 2)]
+    return formulae[0]
@@ -5,6 +5,8 @@
 
 """Tests for the propositions.syntax module."""
 
+import pickle
+
 from logic_utils import frozendict
 
 from propositions.syntax import *
@@ -33,6 +35,17 @@ def test_repr(debug=False):
                              Formula("->", Formula("~", Formula("q")), Formula("~", Formula("p"))))) == \
            '((p->q)->(~q->~p))'
 
+def test_repr_memoized(debug=False):
+    if debug:
+        print("Testing representation of a deep formula")
+    f = Formula('p')
+    for i in range(5000):
+        f = Formula('~', Formula('&', f, Formula('q' + str(i))))
+    s = str(f)
+    assert s.startswith('~(~(~(') and s.endswith('&q4998)&q4999)')
+    assert str(f) is s
+    assert str(Formula('|', f, f)) == '(' + s + '|' + s + ')'
+
 def test_variables(debug=False):
     for f, vs in [(Formula('T'), set()),
                   (Formula('x1234'), {'x1234'}),
@@ -129,6 +142,37 @@ def test_parse(debug=False):
         assert type(ff) is Formula
         assert str(ff) == f
 
+def test_parse_long_formula(debug=False):
+    n = 200
+    s = '(' * n + 'x0' + ''.join('&x' + str(i) + ')' for i in range(1, n + 1))
+    if debug:
+        print("Testing parsing of a conjunction of", n + 1, "variables")
+    ff, rr = Formula.parse_prefix(s + '|y')
+    assert rr == '|y'
+    assert str(ff) == s
+    assert Formula.is_formula('~' * n + s)
+    assert not Formula.is_formula(s[:-1])
+    assert ff.second == Formula('x' + str(n))
+
+def test_interning(debug=False):
+    if debug:
+        print("Testing that structurally identical formulae are shared")
+    f = Formula.parse('((p->q)|~(p->q))')
+    assert f.first is f.second.first
+    assert Formula('|', Formula('->', Formula('p'), Formula('q')),
+                   Formula('~', Formula.parse('(p->q)'))) is f
+    assert Formula.parse('((p->q)|~(q->p))') != f
+    set_interning(False)
+    try:
+        g = Formula.parse('((p->q)|~(p->q))')
+    finally:
+        set_interning(True)
+    if debug:
+        print("Testing equality of interned and uninterned formulae")
+    assert g is not f and g.first is not g.second.first
+    assert g == f and hash(g) == hash(f) and len({f, g}) == 1
+    assert g != Formula.parse('((p->q)|~(p->r))')
+
 # Tests for optional tasks in Chapter 1
 
 def test_polish(debug=False):
@@ -148,6 +192,23 @@ def test_parse_polish(debug=False):
             print("Testing polish parsing of formula", polish)
         assert Formula.parse_polish(polish).polish() == polish
 
+def test_polish_file(debug=False):
+    from io import StringIO
+    formulae = [Formula.parse(infix) for infix in
+                ['p', '~x12', '(x&y)', '~~(x|~T)', '((x1&~x2)|F)',
+                 '((p->q)<->(~q-&p13))']]
+    deep = Formula('p')
+    for i in range(10**4):
+        deep = Formula('+', Formula('~', deep), Formula('q' + str(i)))
+    formulae.append(deep)
+    if debug:
+        print("Testing writing and reading formulae in polish notation")
+    file = StringIO()
+    write_polish(formulae, file)
+    assert file.getvalue().startswith('p\n~x12\n&xy\n~~|x~T\n|&x1~x2F\n')
+    file.seek(0)
+    assert list(read_polish(file)) == formulae
+
 # Tests for Chapter 3
 
 def test_repr_all_operators(debug=False):
@@ -312,17 +373,72 @@ def test_substitute_operators(debug=False):
         a = str(f.substitute_operators(frozendict(d)))
         assert a == r, "Incorrect answer:"+a
                
+def test_deep_formula(debug=False):
+    depth = 10**5
+    if debug:
+        print("Testing operations on a formula of depth", depth)
+    f = Formula('x')
+    for i in range(depth):
+        f = Formula('->', f, Formula('~', Formula('y' + str(i % 7))))
+    assert len(f.variables()) == 8
+    assert f.operators() == {'->', '~'}
+    g = f.substitute_variables({'x': Formula('T'), 'y0': Formula('z')})
+    assert g.variables() == f.variables() - {'x', 'y0'} | {'z'}
+    h = f.substitute_operators({'~': Formula.parse('(p-|p)')})
+    assert h.operators() == {'->', '-|'}
+    s = str(g)
+    assert s.startswith('(' * depth + 'T->~z)->~y1)')
+    assert Formula.parse(s) == g
+
+def test_balanced(debug=False):
+    if debug:
+        print('Testing balanced conjunctions and disjunctions')
+    variables = [Formula('p' + str(i)) for i in range(1000)]
+    for operator in ['&', '|']:
+        formula = balanced(operator, variables)
+        assert formula.variables() == {'p' + str(i) for i in range(1000)}
+        assert formula.operators() == {operator}
+        depth = 0
+        while formula.root == operator:
+            formula = formula.first
+            depth += 1
+        assert formula == variables[0] and depth == 10
+    assert str(balanced('&', variables[:3])) == '((p0&p1)&p2)'
+    assert balanced('&', variables[:1]) == variables[0]
+    assert balanced('&', []) == Formula('T')
+    assert balanced('|', []) == Formula('F')
+
+def test_pickle(debug=False):
+    if debug:
+        print('Testing pickling deep and shared formulae')
+    formula = Formula('p')
+    for i in range(10000):
+        formula = Formula('~' if i % 2 == 0 else '->', formula,
+                          None if i % 2 == 0 else Formula('q' + str(i % 7)))
+    assert pickle.loads(pickle.dumps(formula)) is formula
+    shared = Formula('p')
+    for _ in range(200):
+        shared = Formula('&', shared, shared)
+    assert len(pickle.dumps(shared)) < 10000
+    assert pickle.loads(pickle.dumps(shared)) is shared
+
 def test_ex1(debug=False):
     test_repr(debug)
+    test_repr_memoized(debug)
     test_variables(debug)
     test_operators(debug)
     test_parse_prefix(debug)
     test_is_formula(debug)
     test_parse(debug)
+    test_parse_long_formula(debug)
+    test_interning(debug)
+    test_balanced(debug)
+    test_pickle(debug)
     
 def test_ex1_opt(debug=False):
     test_polish(debug)
     test_parse_polish(debug)
+    test_polish_file(debug)
 
 def test_ex3(debug=False):
     assert is_binary('+'), "Change is_binary() before testing Chapter 3 tasks."
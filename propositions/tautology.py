@@ -15,6 +15,7 @@ from propositions.deduction import *
 from propositions.semantics import *
 from propositions.operators import *
 from propositions.axiomatic_systems import *
+from propositions.sat import Session
 
 
 def formulae_capturing_model(model: Model) -> List[Formula]:
@@ -69,41 +70,43 @@ def prove_in_model(formula: Formula, model:Model) -> Proof:
     assert formula.operators().issubset({'->', '~'})
     assert is_model(model)
     # Task 6.1b
-
-    rules = AXIOMATIC_SYSTEM
-    assumptions = formulae_capturing_model(model)
-
-    conclusion = formula
-    value_of_formula = evaluate(formula, model)
-
-    if not value_of_formula:
-        conclusion = Formula('~', formula)
-
-    statement = InferenceRule(assumptions, conclusion)
-
-    if is_variable(str(formula)) or (is_unary(str(conclusion.root)) and is_variable(str(conclusion.first))):
-        lines = [Proof.Line(conclusion)]
-        return Proof(statement, rules, lines)
-
-    elif is_binary(str(formula.root)):
-        if value_of_formula:
-            if not evaluate(formula.first, model):
-                antecedent_proof = prove_in_model(Formula('~', formula.first), model)
-                return prove_corollary(antecedent_proof, conclusion, I2)
-            elif evaluate(formula.second, model):
-                antecedent_proof = prove_in_model(formula.second, model)
-                return prove_corollary(antecedent_proof, conclusion, I1)
+    # Every subformula is evaluated once, bottom-up, and then proven (or its
+    # negation proven) once, from the proofs of its operands.
+    statement_assumptions = formulae_capturing_model(model)
+    values = {}
+    proofs = {}
+    for subformula in formula.subformulae():
+        if subformula in proofs:
+            continue
+        root = subformula.root
+        if is_variable(root):
+            value = model[root]
+        elif is_unary(root):
+            value = not values[subformula.first]
         else:
-            antecedent_proof_1 = prove_in_model(formula.first, model)
-            antecedent_proof_2 = prove_in_model(Formula('~', formula.second), model)
-            return combine_proofs(antecedent_proof_1, antecedent_proof_2, conclusion, NI)
-
-    elif is_unary(str(formula.root)):
-        if value_of_formula:
-            return prove_in_model(formula.first, model)
+            value = not values[subformula.first] or values[subformula.second]
+        values[subformula] = value
+        conclusion = subformula if value else Formula('~', subformula)
+        if is_variable(root) or \
+                (is_unary(root) and is_variable(subformula.first.root) and
+                 value):
+            proof = Proof(InferenceRule(statement_assumptions, conclusion),
+                          AXIOMATIC_SYSTEM, [Proof.Line(conclusion)])
+        elif is_unary(root):
+            if value:
+                proof = proofs[subformula.first]
+            else:
+                proof = prove_corollary(proofs[subformula.first], conclusion,
+                                        NN)
+        elif not value:
+            proof = combine_proofs(proofs[subformula.first],
+                                   proofs[subformula.second], conclusion, NI)
+        elif not values[subformula.first]:
+            proof = prove_corollary(proofs[subformula.first], conclusion, I2)
         else:
-            antecedent_proof = prove_in_model(formula.first, model)
-            return prove_corollary(antecedent_proof, conclusion, NN)
+            proof = prove_corollary(proofs[subformula.second], conclusion, I1)
+        proofs[subformula] = proof
+    return proofs[formula]
 
 
 def reduce_assumption(proof_from_affirmation: Proof,
@@ -135,8 +138,8 @@ def reduce_assumption(proof_from_affirmation: Proof,
         ``['p', '~q'] ==> ('q'->'p')``, then the returned proof is of
         ``['p'] ==> '(q->p)'``.
     """
-    assert proof_from_affirmation.is_valid()
-    assert proof_from_negation.is_valid()
+    assert is_valid_by_policy(proof_from_affirmation)
+    assert is_valid_by_policy(proof_from_negation)
     assert proof_from_affirmation.statement.conclusion == \
            proof_from_negation.statement.conclusion
     assert len(proof_from_affirmation.statement.assumptions) > 0
@@ -310,25 +313,19 @@ def model_or_inconsistency(formulae: List[Formula]) -> Union[Model, Proof]:
     for formula in formulae:
         assert formula.operators().issubset({'->', '~'})
     # Task 6.5
-    variables = []
+    session = Session()
     for formula in formulae:
-        variables += formula.variables()
-
-    formulas_satisfiable_by_model = 0
-    for model in all_models(variables):
-        formulas_satisfiable_by_model = 0
-        for formula in formulae:
-            if not evaluate(formula, model):
-                formulas_satisfiable_by_model = 0
-                break
-            else:
-                formulas_satisfiable_by_model += 1
-                if formulas_satisfiable_by_model == len(formulae):
-                    return model
-
-    rule = InferenceRule(list(formulae),Formula.parse('~(p->p)'))
-    return prove_sound_inference(rule)
-
+        session.add(formula)
+    model = session.solve()
+    if model is not None:
+        return model
+
+    # Only the formulae of the unsatisfiable core take part in the proof, which
+    # then remains valid with all of the given formulae as assumptions.
+    conclusion = Formula.parse('~(p->p)')
+    proof = prove_sound_inference(InferenceRule(session.core(), conclusion))
+    return Proof(InferenceRule(list(formulae), conclusion), proof.rules,
+                 proof.lines)
 
 
 def prove_in_model_full(formula: Formula, model: Model) -> Proof:
@@ -67,6 +67,20 @@ def test_prove_in_model(debug=False):
 
 
         
+def test_prove_in_model_deep(debug=False):
+    formula = Formula('p')
+    for _ in range(1100):
+        formula = Formula('~', formula)
+    if debug:
+        print('testing prove_in_model on a formula of depth 1100')
+    for value in [True, False]:
+        p = prove_in_model(formula, frozendict({'p': value}))
+        assert p.statement.conclusion == \
+               (formula if value else Formula('~', formula))
+        assert p.rules == AXIOMATIC_SYSTEM
+        assert p.is_valid(), offending_line(p)
+
+
 def test_reduce_assumption(debug=False):
     for f, m, v in [ ('(y->x)', {'x':True}, 'y'),
                      ('(p->p)', {}, 'p'),
@@ -260,6 +274,7 @@ def test_prove_in_model_full(debug=False):
 def test_ex6(debug=False):
     test_formulae_capturing_model(debug)
     test_prove_in_model(debug)
+    test_prove_in_model_deep(debug)
     test_reduce_assumption(debug)
     test_prove_tautology(debug)
     test_proof_or_counterexample(debug)